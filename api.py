@@ -1,14 +1,53 @@
 # mypy: disable-error-code="import-untyped"
 # pyright: reportMissingTypeStubs=false, reportUnknownMemberType=false
 
-from yt_dlp import YoutubeDL
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import asyncio
 
-from model import YoutubeVideo
+from info_cache import shared_info_cache
+from model import MediaSource, YoutubeVideo
 from image import NetworkImage
+from single_flight import SingleFlight
 from utils import expect
+from ytdl_cache import shared_ytdl_cache
+
+if TYPE_CHECKING:
+    from yt_dlp import YoutubeDL
+
+
+# yt_dlp alone takes longer to import than the first frame takes to draw
+def youtube_dl(options: dict[str, object]) -> "YoutubeDL":
+    from yt_dlp import YoutubeDL
+
+    return YoutubeDL(options)
+
+
+# only called once something failed, by then extraction has imported yt_dlp
+def download_error() -> type[Exception]:
+    from yt_dlp.utils import DownloadError
+
+    return DownloadError
+
+
+# cancelling only abandons the executor thread, the extraction itself runs to completion
+_media: SingleFlight[str, MediaSource] = SingleFlight()
+_searches: SingleFlight[tuple[str, int], list[YoutubeVideo]] = SingleFlight()
+
+
+# a fraction of the size of the jpegs, but not every video has them, the jpegs
+# stay as the fallback; default and hqdefault are 4:3 frames with letterbox bars
+WEBP_THUMBNAILS = {
+    "mqdefault": (320, 180),
+}
+
+
+def webp_thumbnails(video_id: str) -> list[NetworkImage]:
+    return [
+        NetworkImage(f"https://i.ytimg.com/vi_webp/{video_id}/{name}.webp", w, h)
+        for name, (w, h) in WEBP_THUMBNAILS.items()
+    ]
 
 
 class YoutubeAPI:
@@ -34,29 +73,84 @@ class YoutubeAPI:
             "quiet": True,
             "noplaylist": True,
             "outtmpl": str(Path(outdir).expanduser().resolve() / "%(title)s.%(ext)s"),
+            **shared_ytdl_cache.options(),
         }
 
-        with YoutubeDL(ydl_opts) as ydl:
-            _ = ydl.download(url)
+        with youtube_dl(ydl_opts) as ydl:
+            for url_or_id in [url] if isinstance(url, str) else url:
+                info = YoutubeAPI.get_info(url_or_id)
+                _ = ydl.process_ie_result(info, download=True)
 
     @staticmethod
-    def get_media_url(url_or_id: str) -> str:
+    async def get_media_async(url_or_id: str) -> MediaSource:
+        loop = asyncio.get_event_loop()
+        return await _media.do(
+            url_or_id,
+            lambda: loop.run_in_executor(None, YoutubeAPI.get_media, url_or_id),
+        )
+
+    @staticmethod
+    def get_media(url_or_id: str) -> MediaSource:
         ydl_opts = {
             "format": "bestaudio",
             "quiet": True,
             "noplaylist": True,
+            **shared_ytdl_cache.options(),
         }
 
-        with YoutubeDL(ydl_opts) as ydl:
+        with youtube_dl(ydl_opts) as ydl:
+            info = YoutubeAPI.get_info(url_or_id)
             info_dict = expect(
-                ydl.extract_info(url_or_id, download=False), dict[str, object]
+                ydl.process_ie_result(info, download=False), dict[str, object]
+            )
+            return MediaSource(
+                url=expect(info_dict.get("url", ""), str),
+                http_headers=expect(info_dict.get("http_headers", {}), dict[str, str]),
             )
-            return expect(info_dict.get("url", ""), str)
+
+    @staticmethod
+    async def get_media_url_async(url_or_id: str) -> str:
+        return (await YoutubeAPI.get_media_async(url_or_id)).url
+
+    @staticmethod
+    def get_media_url(url_or_id: str) -> str:
+        return YoutubeAPI.get_media(url_or_id).url
+
+    # unprocessed, every caller runs its own format selection on the one extraction
+    @staticmethod
+    def get_info(url_or_id: str) -> dict[str, object]:
+        ydl_opts = {
+            "quiet": True,
+            "noplaylist": True,
+            **shared_ytdl_cache.options(),
+        }
+
+        def extract() -> dict[str, object]:
+            with youtube_dl(ydl_opts) as ydl:
+                return expect(
+                    ydl.extract_info(url_or_id, download=False, process=False),
+                    dict[str, object],
+                )
+
+        return shared_info_cache.get_or_extract(url_or_id, extract)
+
+    # the first YoutubeDL pays for option parsing and loading the extractors
+    @staticmethod
+    def warm_up() -> None:
+        shared_ytdl_cache.warm_up()
+        options = {"quiet": True, "extract_flat": True, **shared_ytdl_cache.options()}
+        with youtube_dl(options) as ydl:
+            _ = ydl.get_info_extractor("YoutubeSearch")
+            _ = ydl.get_info_extractor("Youtube")
 
     @staticmethod
     async def search_async(query: str, max_results: int = 5) -> list[YoutubeVideo]:
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, YoutubeAPI.search, query, max_results)
+        videos = await _searches.do(
+            (query, max_results),
+            lambda: loop.run_in_executor(None, YoutubeAPI.search, query, max_results),
+        )
+        return list(videos)
 
     @staticmethod
     def search(query: str, max_results: int = 5) -> list[YoutubeVideo]:
@@ -67,9 +161,10 @@ class YoutubeAPI:
         options = {
             "quiet": True,
             "extract_flat": True,
+            **shared_ytdl_cache.options(),
         }
 
-        with YoutubeDL(options) as ydl:
+        with youtube_dl(options) as ydl:
             info = expect(
                 ydl.extract_info(search_query, download=False), dict[str, object]
             )
@@ -107,6 +202,9 @@ class YoutubeAPI:
                     )
                 )
 
+            if video_id := expect(entry.get("id", ""), str):
+                thumbnails += webp_thumbnails(video_id)
+
             videos.append(
                 YoutubeVideo(
                     title=expect(entry.get("title", ""), str),
@@ -0,0 +1,151 @@
+# pyright: reportUnknownMemberType=false, reportUnknownArgumentType=false, reportUnknownVariableType=false, reportUnknownLambdaType=false
+from collections.abc import AsyncIterator
+from threading import Lock
+from typing import TYPE_CHECKING, final
+
+import asyncio
+import itertools
+
+if TYPE_CHECKING:
+    import mpv
+
+
+def _put_latest[T](queue: asyncio.Queue[T], item: T) -> None:
+    # drop the oldest item instead of blocking mpv's event thread
+    if queue.full():
+        _ = queue.get_nowait()
+    queue.put_nowait(item)
+
+
+def _resolve(
+    future: asyncio.Future[object], error: Exception | None, result: object
+) -> None:
+    if future.done():
+        return
+
+    if error:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _to_mpv_str(value: object) -> str:
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    return str(value)
+
+
+@final
+class AsyncMPV:
+    def __init__(self, player: "mpv.MPV", queue_size: int = 64) -> None:
+        self.player = player
+        self.queue_size = queue_size
+
+        self._lock = Lock()
+        self._reply_ids = itertools.count(1)
+        self._replies: dict[
+            int, tuple[asyncio.AbstractEventLoop, asyncio.Future[object]]
+        ] = {}
+        self._on_reply = player.event_callback("get-property-reply", "shutdown")(
+            self._handle_reply
+        )
+
+    async def command_async(self, name: str, *args: object) -> object:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[object] = loop.create_future()
+
+        def callback(error: Exception | None, result: object) -> None:
+            _ = loop.call_soon_threadsafe(_resolve, future, error, result)
+
+        mpv_future = self.player.command_async(name, *args, callback=callback)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            try:
+                _ = mpv_future.cancel()
+            except KeyError:
+                # the reply already arrived
+                pass
+            raise
+
+    # get_property is a command of the ipc protocol only, libmpv has its own async call
+    async def get_property(self, name: str) -> object:
+        import mpv
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[object] = loop.create_future()
+        with self._lock:
+            reply_id = next(self._reply_ids)
+            self._replies[reply_id] = (loop, future)
+
+        try:
+            mpv._mpv_get_property_async(
+                self.player.handle, reply_id, name.encode("utf-8"), mpv.MpvFormat.NODE
+            )
+            return await future
+        finally:
+            with self._lock:
+                _ = self._replies.pop(reply_id, None)
+
+    # runs on mpv's event thread, the value is only valid until the next event
+    def _handle_reply(self, event: "mpv.MpvEvent") -> None:
+        import mpv
+
+        if event.event_id.value == mpv.MpvEventID.SHUTDOWN:
+            with self._lock:
+                replies = list(self._replies.values())
+                self._replies.clear()
+            for loop, future in replies:
+                error = mpv.ShutdownError("libmpv core has been shutdown")
+                _ = loop.call_soon_threadsafe(_resolve, future, error, None)
+            return
+
+        with self._lock:
+            reply = self._replies.pop(event.reply_userdata, None)
+        if reply is None:
+            return
+
+        loop, future = reply
+        error: Exception | None = None
+        value: object = None
+        # an unavailable property reads as None, like python-mpv's attribute access
+        if event.error < 0 and event.error != mpv.ErrorCode.PROPERTY_UNAVAILABLE:
+            error = mpv.ErrorCode.exception_for_ec(event.error)
+        elif event.error >= 0:
+            value = event.data.value
+        _ = loop.call_soon_threadsafe(_resolve, future, error, value)
+
+    async def set_property(self, name: str, value: object) -> None:
+        _ = await self.command_async("set", name, _to_mpv_str(value))
+
+    async def observe(self, name: str) -> AsyncIterator[object]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[object] = asyncio.Queue(self.queue_size)
+
+        def handler(_: str, value: object) -> None:
+            _ = loop.call_soon_threadsafe(_put_latest, queue, value)
+
+        self.player.observe_property(name, handler)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.player.unobserve_property(name, handler)
+
+    async def events(self, *event_types: str) -> AsyncIterator[dict[str, object]]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[dict[str, object]] = asyncio.Queue(self.queue_size)
+
+        import mpv
+
+        @self.player.event_callback(*event_types)
+        def handler(event: mpv.MpvEvent) -> None:
+            # the event struct is only valid until the next mpv_wait_event
+            data = event.as_dict(decoder=mpv.lazy_decoder)
+            _ = loop.call_soon_threadsafe(_put_latest, queue, data)
+
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            handler.unregister_mpv_events()
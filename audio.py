@@ -1,20 +1,55 @@
 # pyright: reportUnknownMemberType=false, reportUnknownLambdaType=false, reportUnknownArgumentType=false
+from collections.abc import Mapping
 from typing import Callable, final
 
+from async_mpv import AsyncMPV
+from player_log import player_log
 from utils import expect
+from ytdl_cache import shared_ytdl_cache
 
-import mpv
+import json
 
 
 @final
 class AudioPlayer:
-    def __init__(self, filepath: str | None = None, buffer_size: str = "100K") -> None:
-        def my_log(loglevel: str, component: str, message: str) -> None:
-            print("[{}] {}: {}".format(loglevel, component, message))
-
-        self.player = mpv.MPV(ytdl=True, log_handler=my_log, vid="no")
+    def __init__(
+        self,
+        filepath: str | None = None,
+        buffer_size: str = "100K",
+        loglevel: str = "warn",
+    ) -> None:
+        # loading libmpv is left to the first in-process player
+        import mpv
+
+        # mpv filters by level before anything crosses into python
+        self.player = mpv.MPV(
+            ytdl=True,
+            ytdl_raw_options=shared_ytdl_cache.mpv_raw_options(),
+            log_handler=player_log.handler,
+            loglevel=loglevel,
+            vid="no",
+        )
         self.player.demuxer_max_bytes = buffer_size
         self.filepath = filepath
+        self.aio = AsyncMPV(self.player)
+
+        # in-process players are never attached to an already running one
+        self.attached = False
+
+    async def set_user_data_async(self, key: str, value: object) -> None:
+        await self.aio.set_property(f"user-data/youtube-tui/{key}", json.dumps(value))
+
+    async def get_user_data_async(self, key: str) -> object:
+        value = await self.aio.get_property(f"user-data/youtube-tui/{key}")
+        return json.loads(expect(value, str)) if value else None
+
+    # replaces the headers sent with every following loadfile
+    async def set_http_headers_async(self, headers: Mapping[str, str]) -> None:
+        await self.aio.set_property("http-header-fields", "")
+        for name, value in headers.items():
+            _ = await self.aio.command_async(
+                "change-list", "http-header-fields", "append", f"{name}: {value}"
+            )
 
     def register_callback(self, event: str, fn: Callable[[object], None]) -> None:
         self.player.observe_property(event, lambda _, value: fn(value))
@@ -23,6 +58,10 @@ class AudioPlayer:
         self.player.play(self.filepath)
         self.resume()
 
+    async def play_async(self) -> None:
+        _ = await self.aio.command_async("loadfile", self.filepath)
+        await self.resume_async()
+
     def seek_to(self, s: float) -> None:
         self.player.seek(s, "absolute")
 
@@ -35,9 +74,18 @@ class AudioPlayer:
     def resume(self) -> None:
         self.player.pause = False
 
-    def toggle_playback(self) -> bool:
-        self.player.pause = not self.player.pause
-        return self.player.pause
+    async def pause_async(self) -> None:
+        await self.aio.set_property("pause", True)
+
+    async def resume_async(self) -> None:
+        await self.aio.set_property("pause", False)
+
+    async def is_paused_async(self) -> bool:
+        return expect(await self.aio.get_property("pause"), bool)
+
+    async def toggle_playback_async(self) -> bool:
+        _ = await self.aio.command_async("cycle", "pause")
+        return await self.is_paused_async()
 
     def stop(self) -> None:
         self.player.stop()
@@ -53,3 +101,9 @@ class AudioPlayer:
 
     def get_current_time(self) -> float:
         return expect(self.player.time_pos, float)
+
+    async def get_duration_async(self) -> float:
+        return expect(await self.aio.get_property("duration"), float)
+
+    async def get_current_time_async(self) -> float:
+        return expect(await self.aio.get_property("time-pos"), float)
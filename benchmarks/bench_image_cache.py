@@ -0,0 +1,51 @@
+# run from the repository root: python -m benchmarks.bench_image_cache
+
+import os
+import tempfile
+import time
+
+from image import ImageCache, NetworkImage
+
+
+def bench(n: int = 1000, blob_size: int = 8 * 1024) -> None:
+    blob = os.urandom(blob_size)
+    images = [
+        NetworkImage(f"https://i.ytimg.com/vi/{i:011d}/default.jpg", 120, 90)
+        for i in range(n)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ImageCache(os.path.join(tmp, "image_cache.db"))
+
+        start = time.perf_counter()
+        for image in images:
+            cache.update_cache(image, blob, '"etag"', None)
+        queued = time.perf_counter() - start
+        cache.flush()
+        inserted = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for image in images:
+            _ = cache.get_cached_image(image.url)
+        lookups = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(n):
+            _ = cache.get_cached_image(f"https://i.ytimg.com/vi/missing{i}.jpg")
+        misses = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(0, n, 50):
+            _ = cache.get_cached_images([image.url for image in images[i : i + 50]])
+        batched = time.perf_counter() - start
+
+        cache.close()
+
+    print(f"{n} inserts:  {inserted * 1000:8.2f} ms ({queued * 1000:.2f} ms queued)")
+    print(f"{n} lookups:  {lookups * 1000:8.2f} ms")
+    print(f"{n} misses:   {misses * 1000:8.2f} ms")
+    print(f"{n} batched:  {batched * 1000:8.2f} ms (50 urls per query)")
+
+
+if __name__ == "__main__":
+    bench()
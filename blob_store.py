@@ -0,0 +1,66 @@
+from pathlib import Path
+from typing import final
+
+import mmap
+import os
+import shutil
+import tempfile
+
+
+@final
+class BlobStore:
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        # shard on the first byte so no directory grows past a few thousand entries
+        return self.root / digest[:2] / digest
+
+    def __contains__(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def put(self, digest: str, data: bytes) -> None:
+        path = self.path(digest)
+        if path.exists():
+            return
+
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                _ = f.write(data)
+            # atomic, concurrent writers of the same digest write the same bytes
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def get(self, digest: str) -> mmap.mmap | bytes | None:
+        try:
+            with open(self.path(digest), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+
+    def touch(self, digest: str) -> None:
+        try:
+            os.utime(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, digest: str) -> None:
+        try:
+            os.unlink(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def digests(self, prefix: str = "") -> set[str]:
+        pattern = f"{prefix[:2]}/{prefix}*" if len(prefix) >= 2 else f"??/{prefix}*"
+        return {p.name for p in self.root.glob(pattern) if not p.name.startswith("tmp")}
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.root.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,191 @@
+# pyright: reportPrivateUsage=false, reportMissingSuperCall=false
+
+from PIL import Image
+from rich.console import Console, ConsoleOptions, RenderResult
+from rich.measure import Measurement
+from textual_image._geometry import ImageSize
+from textual_image._sixel import BackgroundColor, SixelOptions
+from textual_image._terminal import get_cell_size
+from textual_image.renderable import Image as AutoRenderable
+from textual_image.renderable import HalfcellImage, SixelImage as SixelRenderable
+from textual_image.renderable import UnicodeImage
+from textual_image.widget.sixel import Image as SixelImage
+from textual_image.widget.sixel import _ImageSixelImpl, _NoopRenderable
+from rich.segment import Segment
+from textual.app import ComposeResult
+from textual.dom import NoScreen
+from textual.geometry import Region
+from textual.strip import Strip
+from typing import Callable, Literal, final, override
+
+from render_cache import RenderCache, shared_render_cache
+
+# TGP segments carry a per-upload terminal image id, only these can be replayed
+CACHEABLE = AutoRenderable in (HalfcellImage, UnicodeImage)
+SIXEL = AutoRenderable is SixelRenderable
+PROTOCOL = AutoRenderable.__module__.rsplit(".", 1)[-1]
+
+type Dimension = int | Literal["auto"] | None
+
+
+@final
+class CachedRenderable:
+    def __init__(
+        self,
+        digest: str,
+        image: Image.Image | None,
+        image_size: tuple[int, int],
+        width: Dimension,
+        height: Dimension,
+        on_cached: Callable[[], None],
+        on_missing: Callable[[], None],
+        cache: RenderCache = shared_render_cache,
+    ) -> None:
+        self.digest = digest
+        self.image = image
+        self.size = ImageSize(*image_size, width, height)
+        self.width = width
+        self.height = height
+        self.on_cached = on_cached
+        self.on_missing = on_missing
+        self.cache = cache
+
+    def _cells(self, options: ConsoleOptions) -> tuple[int, int]:
+        return self.size.get_cell_size(
+            options.max_width, options.max_height, get_cell_size()
+        )
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        key = RenderCache.key(
+            self.digest, PROTOCOL, self._cells(options), tuple(get_cell_size())
+        )
+
+        segments = self.cache.get(key)
+        if segments is None:
+            if self.image is None:
+                # evicted after the original was dropped
+                self.on_missing()
+                return
+
+            renderable = AutoRenderable(self.image, self.width, self.height)
+            segments = list(renderable.__rich_console__(console, options))
+            self.cache.put(key, segments)
+
+        self.on_cached()
+        yield from segments
+
+    def __rich_measure__(self, console: Console, options: ConsoleOptions) -> Measurement:
+        width, _ = self._cells(options)
+        return Measurement(width, width)
+
+
+@final
+class _CachedSixelImpl(_ImageSixelImpl):
+    def __init__(
+        self,
+        digest: str,
+        image: Image.Image | None,
+        sixel_options: SixelOptions | None,
+        on_cached: Callable[[], None],
+        on_missing: Callable[[], None],
+        cache: RenderCache,
+    ) -> None:
+        super().__init__(image, sixel_options)
+
+        self.digest = digest
+        self.on_cached = on_cached
+        self.on_missing = on_missing
+        self.cache = cache
+        self._key = ""
+
+    # looked up before the image is scaled, so a hit does not need the original
+    @override
+    def render_lines(self, crop: Region) -> list[Strip]:
+        try:
+            if not self.screen.is_active:
+                return []
+        except NoScreen:
+            return []
+
+        self._key = RenderCache.key(
+            self.digest,
+            "sixel",
+            tuple(crop),
+            tuple(self.content_size),
+            tuple(get_cell_size()),
+            repr(self._sixel_options),
+            self._get_background_rgba(),
+        )
+
+        sixels = self.cache.get(self._key)
+        if isinstance(sixels, str):
+            lines = self._sixel_lines(crop, sixels)
+        elif self.image is None:
+            # evicted after the original was dropped
+            self.on_missing()
+            return []
+        else:
+            lines = super().render_lines(crop)
+
+        # a partly scrolled-in row needs the original again for every new crop
+        if crop.size == self.content_size:
+            self.on_cached()
+        return lines
+
+    def _sixel_lines(self, crop: Region, sixels: str) -> list[Strip]:
+        clear = Segment(" " * crop.width, style=self._get_clear_style())
+        lines = [Strip([clear], cell_length=crop.width) for _ in range(crop.height - 1)]
+        lines.append(
+            Strip([clear, *self._get_sixel_segments(sixels)], cell_length=crop.width)
+        )
+        return lines
+
+    @override
+    def _image_to_sixels(
+        self,
+        image: Image.Image,
+        sixel_options: SixelOptions | None = None,
+        background: BackgroundColor | None = None,
+    ) -> str:
+        sixels = super()._image_to_sixels(image, sixel_options, background)
+        self.cache.put(self._key, sixels)
+        return sixels
+
+    def release_image(self) -> None:
+        self.image = None
+        self._cached_sixels = None
+
+
+@final
+class CachedSixelImage(SixelImage, Renderable=_NoopRenderable):
+    def __init__(
+        self,
+        image: Image.Image | None,
+        digest: str,
+        on_cached: Callable[[], None],
+        on_missing: Callable[[], None],
+        cache: RenderCache = shared_render_cache,
+    ) -> None:
+        self.digest = digest
+        self.on_cached = on_cached
+        self.on_missing = on_missing
+        self.cache = cache
+
+        super().__init__(image)
+
+    @override
+    def compose(self) -> ComposeResult:
+        yield _CachedSixelImpl(
+            self.digest,
+            self.image,
+            self._sixel_options,
+            self.on_cached,
+            self.on_missing,
+            self.cache,
+        )
+
+    # the sixel string is cached, the original is only needed to encode it again
+    def release_image(self) -> None:
+        self._image = None
+        for impl in self.query(_CachedSixelImpl):
+            impl.release_image()
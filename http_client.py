@@ -0,0 +1,170 @@
+from collections import deque
+from collections.abc import Mapping
+from dataclasses import dataclass
+from threading import Lock
+from typing import TYPE_CHECKING, final
+
+import asyncio
+import time
+
+# both take a noticeable part of startup, they load with the first request
+if TYPE_CHECKING:
+    import aiohttp
+    import requests
+
+
+@dataclass
+class Response:
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+
+
+class HttpError(OSError):
+    def __init__(self, reason: str, status: int | None = None) -> None:
+        super().__init__(reason)
+
+        self.reason = reason
+        self.status = status
+
+
+@final
+class LatencyStats:
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+@final
+class HttpClient:
+    def __init__(
+        self,
+        limit: int = 32,
+        limit_per_host: int = 8,
+        keepalive_timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        total_timeout: float = 15.0,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.total_timeout = total_timeout
+
+        self._session: "aiohttp.ClientSession | None" = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        self._sync_session: "requests.Session | None" = None
+        self._sync_lock = Lock()
+
+    def session(self) -> "aiohttp.ClientSession":
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        # a session is bound to the loop it was created on
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.total_timeout, connect=self.connect_timeout
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._loop = loop
+
+        return self._session
+
+    def sync_session(self) -> "requests.Session":
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with self._sync_lock:
+            if self._sync_session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=self.limit, pool_maxsize=self.limit_per_host
+                )
+                self._sync_session = requests.Session()
+                self._sync_session.mount("http://", adapter)
+                self._sync_session.mount("https://", adapter)
+
+            return self._sync_session
+
+    # neither transport raises for error statuses, callers decide what they mean
+    async def get_async(
+        self, url: str, headers: Mapping[str, str] | None = None
+    ) -> Response:
+        import aiohttp
+
+        try:
+            async with self.session().get(url, headers=headers) as response:
+                return Response(response.status, response.headers, await response.read())
+        except asyncio.TimeoutError as e:
+            raise HttpError("timeout") from e
+        except aiohttp.ClientError as e:
+            raise HttpError(type(e).__name__) from e
+
+    def get(
+        self,
+        url: str,
+        headers: Mapping[str, str] | None = None,
+        deadline: float | None = None,
+    ) -> Response:
+        import requests
+
+        # requests has no total timeout, the read timeout applies per chunk;
+        # with a deadline the body is streamed and the clock checked between chunks
+        read_timeout = min(self.total_timeout, deadline or self.total_timeout)
+        ends_at = time.monotonic() + (deadline or 0)
+        try:
+            response = self.sync_session().get(
+                url,
+                headers=headers,
+                timeout=(self.connect_timeout, read_timeout),
+                stream=deadline is not None,
+            )
+            if deadline is None:
+                body = response.content
+            else:
+                chunks: list[bytes] = []
+                with response:
+                    for chunk in response.iter_content(8 * 1024):
+                        if time.monotonic() > ends_at:
+                            raise HttpError("timeout")
+                        chunks.append(chunk)
+                body = b"".join(chunks)
+        except requests.Timeout as e:
+            raise HttpError("timeout") from e
+        except requests.RequestException as e:
+            raise HttpError(type(e).__name__) from e
+
+        return Response(response.status_code, response.headers, body)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+        self._session = None
+        self._loop = None
+
+        with self._sync_lock:
+            if self._sync_session is not None:
+                self._sync_session.close()
+                self._sync_session = None
+
+
+shared_http = HttpClient()
@@ -1,20 +1,81 @@
 # pyright: reportUnknownArgumentType=false, reportUnknownMemberType=false
 
 import sqlite3
-import requests
+import atexit
 import io
+import mmap
 import hashlib
-import aiohttp
+import asyncio
 import re
+import time
 
 from PIL import Image
+from collections.abc import Callable, Mapping
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dataclasses import dataclass
-from typing import final, TypedDict
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from threading import Condition, Lock, Thread
+from typing import final, Literal, Self, TypedDict
 
+from blob_store import BlobStore
+from http_client import HttpClient, HttpError, LatencyStats, Response, shared_http
+from placeholder import make_placeholder
+from player_log import player_log
+from single_flight import SingleFlight
 from utils import expect, join_overlap
 
 
+@dataclass
+class CachedImage:
+    image_data: bytes | mmap.mmap
+    etag: str | None
+    last_modified: str | None
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers: dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def open(self) -> Image.Image:
+        # PIL reads straight from the mapping, no copy into python bytes
+        if isinstance(self.image_data, mmap.mmap):
+            _ = self.image_data.seek(0)
+            return Image.open(self.image_data)
+        return Image.open(io.BytesIO(self.image_data))
+
+
+@dataclass
+class FetchFailure:
+    reason: str
+    attempts: int
+    retry_at: float
+
+
+class ImageUnavailableError(Exception):
+    def __init__(self, url: str, failure: FetchFailure) -> None:
+        super().__init__(
+            f"{url} failed {failure.attempts} time(s) ({failure.reason}), "
+            f"retrying after {datetime.fromtimestamp(failure.retry_at):%H:%M:%S}"
+        )
+
+        self.url = url
+        self.failure = failure
+
+
+# how far off the declared aspect ratio a thumbnail may be and still be cached
+ASPECT_TOLERANCE = 0.1
+
+
 @dataclass
 class NetworkImage:
     url: str
@@ -25,108 +86,513 @@ class NetworkImage:
         if not re.match(r"http(s)?://", self.url):
             self.url = join_overlap("https://", self.url)
 
-    async def fetch_async(self, ignore_cache: bool = False) -> Image.Image:
-        cache_manager = ImageCache()
+    def usable_size(self, width: int, height: int) -> bool:
+        if width <= 0 or height <= 0:
+            return False
+        if self.width <= 0 or self.height <= 0 or (width, height) == (
+            self.width,
+            self.height,
+        ):
+            return True
 
-        if not ignore_cache:
-            cached_data = cache_manager.get_cached_image(self.url)
-            if cached_data:
-                image_data, etag, last_modified = cached_data
-
-                headers = {}
-                if etag:
-                    headers["If-None-Match"] = etag
-                if last_modified:
-                    headers["If-Modified-Since"] = last_modified
-
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.head(
-                            self.url, headers=headers
-                        ) as head_response:
-                            if head_response.status == 304:
-                                return Image.open(io.BytesIO(image_data))
-                except aiohttp.ClientError:
-                    return Image.open(io.BytesIO(image_data))
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.url) as response:
-                response.raise_for_status()
-                image_data = await response.read()
+        # a rescaled or re-encoded variant is fine, a different picture is not
+        expected = self.width / self.height
+        return abs(width / height - expected) <= expected * ASPECT_TOLERANCE
 
+    def validate(self, image_data: bytes) -> Image.Image:
         img = Image.open(io.BytesIO(image_data))
-        if img.size != (self.width, self.height):
+        if not self.usable_size(*img.size):
             raise ValueError(
                 (
                     f"Image dimensions mismatch. Expected {self.width}x{self.height}, "
                     f"got {img.size[0]}x{img.size[1]}"
                 )
             )
+        return img
 
-        cache_manager.update_cache(
-            self,
-            image_data,
+    # pass cached when the caller already looked it up in a batch
+    async def fetch_async(
+        self, ignore_cache: bool = False, cached: CachedImage | None = None
+    ) -> Image.Image:
+        return await shared_fetcher.fetch_async(self, ignore_cache, cached)
+
+    def fetch(self, ignore_cache: bool = False) -> Image.Image:
+        return shared_fetcher.fetch(self, ignore_cache)
+
+
+@dataclass
+class FetchMetrics:
+    fresh_hits: int = 0
+    stale_hits: int = 0
+    negative_hits: int = 0
+    downloads: int = 0
+    not_modified: int = 0
+    failures: int = 0
+    bytes_downloaded: int = 0
+    network_seconds: float = 0.0
+    hedged: int = 0
+    hedge_wins: int = 0
+    deadlines_exceeded: int = 0
+
+    def __post_init__(self) -> None:
+        self._lock = Lock()
+
+    def add(self, **deltas: float) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+
+# the same cache rules for both transports: hits are served at once and stale
+# ones revalidated in the background, known failures wait out their backoff
+@final
+class ImageFetcher:
+    # used until enough downloads have been timed
+    DEFAULT_HEDGE_DELAY = 1.0
+    MIN_HEDGE_DELAY = 0.05
+
+    def __init__(
+        self,
+        http: HttpClient = shared_http,
+        deadline: float = 8.0,
+        hedge_quantile: float = 0.9,
+    ) -> None:
+        self.http = http
+        self.deadline = deadline
+        self.hedge_quantile = hedge_quantile
+        self.metrics = FetchMetrics()
+        self.latency = LatencyStats()
+
+        self._revalidating: set[str] = set()
+        self._revalidate_pool: ThreadPoolExecutor | None = None
+        self._lock = Lock()
+
+    def _hit(self, cached: CachedImage) -> Image.Image:
+        self.metrics.add(**{"fresh_hits" if cached.fresh else "stale_hits": 1})
+        return cached.open()
+
+    def _check_failure(self, cache: "ImageCache", image: NetworkImage) -> None:
+        if failure := cache.get_failure(image.url):
+            self.metrics.add(negative_hits=1)
+            raise ImageUnavailableError(image.url, failure)
+
+    def _accept(self, image: NetworkImage, response: Response, started: float) -> None:
+        self.metrics.add(network_seconds=time.perf_counter() - started)
+        if response.status >= 400:
+            raise HttpError(f"HTTP {response.status}", response.status)
+
+        _ = image.validate(response.body)
+        self.metrics.add(downloads=1, bytes_downloaded=len(response.body))
+
+    def _failed(self, e: Exception) -> tuple[str, int | None]:
+        self.metrics.add(failures=1)
+        if isinstance(e, HttpError):
+            return e.reason, e.status
+        if isinstance(e, ValueError):
+            return "dimensions mismatch", None
+        if isinstance(e, Image.UnidentifiedImageError):
+            return "not an image", None
+        return type(e).__name__, None
+
+    @staticmethod
+    def _cache_fields(
+        cache: "ImageCache", response: Response
+    ) -> tuple[str | None, str | None, float]:
+        return (
             response.headers.get("ETag"),
             response.headers.get("Last-Modified"),
+            cache.expiry_from_headers(response.headers),
         )
 
-        return img
+    def fetch(self, image: NetworkImage, ignore_cache: bool = False) -> Image.Image:
+        cache = ImageCache()
 
-    def fetch(self, ignore_cache: bool = False) -> Image.Image:
-        cache_manager = ImageCache()
+        if not ignore_cache and (cached := cache.get_cached_image(image.url)):
+            if not cached.fresh:
+                self._schedule_revalidate(image, cached)
+            return self._hit(cached)
+
+        self._check_failure(cache, image)
+
+        started = time.perf_counter()
+        try:
+            response = self._timed_get(image.url)
+            self._accept(image, response, started)
+        except (ValueError, OSError) as e:
+            cache.record_failure(image.url, *self._failed(e))
+            raise
+
+        cache.update_cache(image, response.body, *self._cache_fields(cache, response))
+        return Image.open(io.BytesIO(response.body))
+
+    # the same deadline and latency samples as the async transport
+    def _timed_get(
+        self, url: str, headers: Mapping[str, str] | None = None
+    ) -> Response:
+        started = time.perf_counter()
+        try:
+            response = self.http.get(url, headers, deadline=self.deadline)
+        except HttpError:
+            if time.perf_counter() - started >= self.deadline:
+                self.metrics.add(deadlines_exceeded=1)
+            raise
+        self.latency.record(time.perf_counter() - started)
+        return response
+
+    def revalidate(self, image: NetworkImage, cached: CachedImage) -> None:
+        cache = ImageCache()
+
+        started = time.perf_counter()
+        response = self._timed_get(image.url, cached.conditional_headers())
+        if response.status == 304:
+            self.metrics.add(network_seconds=time.perf_counter() - started)
+            self.metrics.add(not_modified=1)
+            cache.refresh_expiry(image.url, cache.expiry_from_headers(response.headers))
+            return
+
+        self._accept(image, response, started)
+        cache.update_cache(image, response.body, *self._cache_fields(cache, response))
+
+    def _schedule_revalidate(self, image: NetworkImage, cached: CachedImage) -> None:
+        with self._lock:
+            if image.url in self._revalidating:
+                return
+            self._revalidating.add(image.url)
+
+            if self._revalidate_pool is None:
+                self._revalidate_pool = ThreadPoolExecutor(
+                    2, thread_name_prefix="ImageRevalidateThread"
+                )
+
+        def run() -> None:
+            try:
+                self.revalidate(image, cached)
+            except (ValueError, OSError):
+                pass
+            finally:
+                with self._lock:
+                    self._revalidating.discard(image.url)
+
+        _ = self._revalidate_pool.submit(run)
+
+    async def fetch_async(
+        self,
+        image: NetworkImage,
+        ignore_cache: bool = False,
+        cached: CachedImage | None = None,
+    ) -> Image.Image:
+        cache = ImageCache()
 
         if not ignore_cache:
-            cached_data = cache_manager.get_cached_image(self.url)
-            if cached_data:
-                image_data, etag, last_modified = cached_data
+            if cached is None:
+                cached = await cache.get_cached_image_async(image.url)
+            if cached:
+                # stale-while-revalidate, never wait on the network for a hit
+                if not cached.fresh:
+                    shared_revalidator.schedule(image, cached)
+                return self._hit(cached)
 
-                headers = {}
-                if etag:
-                    headers["If-None-Match"] = etag
-                if last_modified:
-                    headers["If-Modified-Since"] = last_modified
+        self._check_failure(cache, image)
 
-                try:
-                    head_response = requests.head(self.url, headers=headers)
-                    head_response.raise_for_status()
+        # concurrent callers share one download, each gets its own Image
+        image_data = await _inflight.do(image.url, lambda: self._download_async(image))
+        return Image.open(io.BytesIO(image_data))
 
-                    if head_response.status_code == 304:
-                        return Image.open(io.BytesIO(image_data))
-                except requests.RequestException:
-                    return Image.open(io.BytesIO(image_data))
+    async def _download_async(self, image: NetworkImage) -> bytes:
+        cache = ImageCache()
 
-        response = requests.get(self.url)
-        response.raise_for_status()
-        image_data = response.content
+        started = time.perf_counter()
+        try:
+            response = await self._get_hedged(image.url)
+            self._accept(image, response, started)
+        except (ValueError, OSError) as e:
+            await cache.record_failure_async(image.url, *self._failed(e))
+            raise
 
-        img = Image.open(io.BytesIO(image_data))
-        if img.size != (self.width, self.height):
-            raise ValueError(
-                (
-                    f"Image dimensions mismatch. Expected {self.width}x{self.height}, "
-                    f"got {img.size[0]}x{img.size[1]}"
+        await cache.update_cache_async(
+            image, response.body, *self._cache_fields(cache, response)
+        )
+        return response.body
+
+    async def _timed_get_async(
+        self, url: str, headers: Mapping[str, str] | None = None
+    ) -> Response:
+        started = time.perf_counter()
+        response = await self.http.get_async(url, headers)
+        self.latency.record(time.perf_counter() - started)
+        return response
+
+    async def _get_hedged(self, url: str) -> Response:
+        delay = self.latency.quantile(self.hedge_quantile) or self.DEFAULT_HEDGE_DELAY
+        tasks = [asyncio.create_task(self._timed_get_async(url))]
+        try:
+            async with asyncio.timeout(self.deadline):
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(delay, self.MIN_HEDGE_DELAY)
                 )
+                if not done:
+                    # slower than most, a second connection likely overtakes it
+                    self.metrics.add(hedged=1)
+                    tasks.append(asyncio.create_task(self._timed_get_async(url)))
+
+                # the first success wins, a failure only counts once both failed
+                pending = set(tasks)
+                while True:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    winners = [task for task in done if task.exception() is None]
+                    if winners or not pending:
+                        winner = winners[0] if winners else done.pop()
+                        if winner is not tasks[0]:
+                            self.metrics.add(hedge_wins=1)
+                        return winner.result()
+        except TimeoutError as e:
+            self.metrics.add(deadlines_exceeded=1)
+            raise HttpError("timeout") from e
+        finally:
+            for task in tasks:
+                _ = task.cancel()
+
+    async def revalidate_async(self, image: NetworkImage, cached: CachedImage) -> None:
+        cache = ImageCache()
+
+        started = time.perf_counter()
+        async with asyncio.timeout(self.deadline):
+            response = await self._timed_get_async(
+                image.url, cached.conditional_headers()
+            )
+        if response.status == 304:
+            self.metrics.add(network_seconds=time.perf_counter() - started)
+            self.metrics.add(not_modified=1)
+            await cache.refresh_expiry_async(
+                image.url, cache.expiry_from_headers(response.headers)
             )
+            return
 
-        cache_manager.update_cache(
-            self,
-            image_data,
-            response.headers.get("ETag"),
-            response.headers.get("Last-Modified"),
+        self._accept(image, response, started)
+        await cache.update_cache_async(
+            image, response.body, *self._cache_fields(cache, response)
         )
 
-        return img
+
+shared_fetcher = ImageFetcher()
+_inflight: SingleFlight[str, bytes] = SingleFlight()
+
+
+@final
+class CacheRevalidator:
+    def __init__(self, batch_delay: float = 0.5, concurrency: int = 4) -> None:
+        self.batch_delay = batch_delay
+        self.concurrency = concurrency
+
+        self._stale: dict[str, tuple[NetworkImage, CachedImage]] = {}
+        self._task: asyncio.Task[None] | None = None
+
+    def schedule(self, image: NetworkImage, cached: CachedImage) -> None:
+        self._stale[image.url] = (image, cached)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        # let a screenful of hits accumulate into one batch
+        await asyncio.sleep(self.batch_delay)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def revalidate(image: NetworkImage, cached: CachedImage) -> None:
+            async with semaphore:
+                try:
+                    await shared_fetcher.revalidate_async(image, cached)
+                except (ValueError, OSError):
+                    pass
+
+        while self._stale:
+            batch, self._stale = self._stale, {}
+            _ = await asyncio.gather(*(revalidate(*v) for v in batch.values()))
+
+
+shared_revalidator = CacheRevalidator()
+
+
+# an update instead of a replace keeps pinned and hits of an existing row, and
+# clears the inline image_data that rows from before the BlobStore still carry
+_UPSERT_IMAGE = """
+    INSERT INTO images
+    (url, etag, last_modified, width, height, image_data, downloaded_at, hash,
+     expires_at, size, last_access)
+    VALUES (?, ?, ?, ?, ?, NULL, ?, ?, ?, ?, (julianday('now') - 2440587.5) * 86400.0)
+    ON CONFLICT(url) DO UPDATE SET
+        etag = excluded.etag,
+        last_modified = excluded.last_modified,
+        width = excluded.width,
+        height = excluded.height,
+        image_data = NULL,
+        downloaded_at = excluded.downloaded_at,
+        hash = excluded.hash,
+        expires_at = excluded.expires_at,
+        size = excluded.size,
+        last_access = excluded.last_access
+"""
+# placeholders outlive the images they were made from, they matter most once
+# the image itself is gone
+_UPSERT_PLACEHOLDER = """
+    INSERT OR REPLACE INTO placeholders (url, data, updated_at) VALUES (?, ?, ?)
+"""
+_SELECT_PLACEHOLDERS = "SELECT url, data FROM placeholders WHERE url IN ({})"
+# kept far longer than the images, they are tiny
+PLACEHOLDER_MAX_AGE = 180 * 24 * 60 * 60
+_SELECT_IMAGES = """
+    SELECT url, image_data, etag, last_modified, expires_at, hash
+    FROM images WHERE url IN ({})
+"""
+# quiet seconds before the one full VACUUM that enables incremental vacuums
+IDLE_BEFORE_VACUUM = 60.0
+# seconds before retrying a failed write batch, doubling up to the maximum
+WRITE_RETRY_DELAY = 0.5
+WRITE_RETRY_MAX = 30.0
+_SELECT_INLINE = (
+    "SELECT url, image_data FROM images WHERE image_data IS NOT NULL LIMIT ?"
+)
+_MOVE_INLINE = "UPDATE images SET hash = ?, size = ?, image_data = NULL WHERE url = ?"
+# stays below SQLITE_MAX_VARIABLE_NUMBER on old builds
+_SELECT_CHUNK = 500
+_UPDATE_EXPIRY = "UPDATE images SET expires_at = ? WHERE url = ?"
+_UPDATE_PINNED = "UPDATE images SET pinned = ? WHERE url = ?"
+_UPDATE_ACCESS = "UPDATE images SET last_access = ?, hits = hits + ? WHERE url = ?"
+
+# shared blobs are counted once
+_BLOB_BYTES = """
+    SELECT SUM(size) FROM (SELECT MAX(size) as size FROM images GROUP BY hash)
+"""
+
+# bytes of webp rows, and what the same pixels cost as the jpegs we have cached
+_WEBP_SAVINGS = """
+    SELECT
+        COALESCE(SUM(CASE WHEN url LIKE '%.webp' THEN size END), 0),
+        COALESCE(SUM(CASE WHEN url LIKE '%.webp' THEN width * height END), 0),
+        SUM(CASE WHEN url NOT LIKE '%.webp' THEN size END) * 1.0
+            / SUM(CASE WHEN url NOT LIKE '%.webp' THEN width * height END)
+    FROM images WHERE width > 0 AND height > 0
+"""
+
+# columns added after the first release, with their definitions
+_MIGRATIONS = {
+    "expires_at": "REAL DEFAULT 0",
+    "size": "INTEGER",
+    "last_access": "REAL",
+    "hits": "INTEGER DEFAULT 0",
+    "pinned": "INTEGER DEFAULT 0",
+}
+
+# url, etag, last_modified, width, height, downloaded_at, hash, expires_at, size
+type _ImageRow = tuple[str, str | None, str | None, int, int, str, str, float, int]
 
 
 @final
 class ImageCache:
-    def __init__(self, db_path: str = "image_cache.db"):
+    # youtube sends max-age=7200, but thumbnails practically never change
+    DEFAULT_MIN_TTL = 7 * 24 * 60 * 60
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+    # seconds to wait before the nth retry of a failed url, the last one repeats
+    FAILURE_BACKOFF = (60, 5 * 60, 30 * 60, 6 * 60 * 60, 24 * 60 * 60)
+    # statuses that will not fix themselves soon, they skip the short retries
+    PERMANENT_STATUSES = (404, 410)
+
+    _instances: dict[str, "ImageCache"] = {}
+    _instances_lock: Lock = Lock()
+
+    # one cache (connections, writer thread) per database file
+    def __new__(
+        cls,
+        db_path: str = "image_cache.db",
+        min_ttl: float = DEFAULT_MIN_TTL,
+        batch_size: int = 64,
+        flush_interval: float = 0.25,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> Self:
+        with cls._instances_lock:
+            if (instance := cls._instances.get(db_path)) is None:
+                instance = super().__new__(cls)
+                instance._setup(
+                    db_path, min_ttl, batch_size, flush_interval, max_bytes
+                )
+                cls._instances[db_path] = instance
+        return instance
+
+    def _setup(
+        self,
+        db_path: str,
+        min_ttl: float,
+        batch_size: int,
+        flush_interval: float,
+        max_bytes: int,
+    ) -> None:
         self.db_path = db_path
+        self.min_ttl = min_ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_pending = batch_size * 16
+        self.policy: Literal["lru", "lfu"] = "lru"
+
+        self._write_conn = self._connect()
+        self._write_lock = Lock()
         self._init_db()
 
+        self._read_conn = self._connect()
+        self._read_lock = Lock()
+
+        # small and checked before every download, so it lives in memory
+        with self._read_lock:
+            self._failures = {
+                expect(url, str): FetchFailure(reason, attempts, retry_at)
+                for url, reason, attempts, retry_at in self._read_conn.execute(
+                    "SELECT url, reason, attempts, retry_at FROM failures"
+                )
+            }
+
+        self.blobs = BlobStore(Path(db_path).with_name(f"{Path(db_path).stem}_blobs"))
+
+        # every *_async method runs here, off the event loop
+        self._io = ThreadPoolExecutor(1, thread_name_prefix="ImageCacheIOThread")
+        self._lookups: dict[str, list[asyncio.Future[CachedImage | None]]] | None = None
+        self._lookup_task: asyncio.Future[None] | None = None
+
+        # write-behind queue, readers see these before they are committed
+        self._pending: dict[str, tuple[_ImageRow, bytes]] = {}
+        # url -> (last access, hits since the last flush), written with the next batch
+        self._accessed: dict[str, tuple[float, int]] = {}
+        self._pins: dict[str, bool] = {}
+        self._placeholders: dict[str, bytes] = {}
+        self._cond = Condition()
+        self._flush_requested = False
+        self._writing = False
+        self._closed = False
+        self.write_failures = 0
+        self._retry_at = 0.0
+        self._last_activity = time.monotonic()
+
+        self._writer = Thread(
+            target=self._write_loop, name="ImageCacheWriterThread", daemon=True
+        )
+        self._writer.start()
+        _ = atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=64,
+        )
+        _ = conn.execute("PRAGMA journal_mode=WAL")
+        _ = conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
     def _init_db(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            _ = conn.execute(
+        with self._write_lock:
+            _ = self._write_conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS images (
                     url TEXT PRIMARY KEY,
@@ -136,26 +602,384 @@ class ImageCache:
                     height INTEGER,
                     image_data BLOB,
                     downloaded_at TIMESTAMP,
-                    hash TEXT
+                    hash TEXT,
+                    expires_at REAL DEFAULT 0,
+                    size INTEGER,
+                    last_access REAL,
+                    hits INTEGER DEFAULT 0,
+                    pinned INTEGER DEFAULT 0
                 )
             """
             )
-            conn.commit()
 
-    def get_cached_image(self, url: str) -> tuple[bytes, str, str] | None:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                "SELECT image_data, etag, last_modified FROM images WHERE url = ?",
-                (url,),
+            _ = self._write_conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS placeholders (
+                    url TEXT PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    updated_at REAL
+                )
+            """
             )
-            result = expect(cursor.fetchone(), list[object])
-            if result:
-                return (
-                    expect(result[0], bytes),
-                    expect(result[1], str),
-                    expect(result[2], str),
+
+            _ = self._write_conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS failures (
+                    url TEXT PRIMARY KEY,
+                    reason TEXT,
+                    attempts INTEGER,
+                    failed_at REAL,
+                    retry_at REAL
                 )
-        return None
+            """
+            )
+
+            columns = {
+                row[1]
+                for row in self._write_conn.execute("PRAGMA table_info(images)")
+            }
+            for column, definition in _MIGRATIONS.items():
+                if column not in columns:
+                    _ = self._write_conn.execute(
+                        f"ALTER TABLE images ADD COLUMN {column} {definition}"
+                    )
+            if "size" not in columns:
+                _ = self._write_conn.execute(
+                    "UPDATE images SET size = LENGTH(image_data)"
+                )
+            if "placeholder" in columns:
+                # they used to live in the image row and went with it on eviction
+                _ = self._write_conn.execute(
+                    """
+                    INSERT OR IGNORE INTO placeholders (url, data, updated_at)
+                    SELECT url, placeholder, (julianday('now') - 2440587.5) * 86400.0
+                    FROM images WHERE placeholder IS NOT NULL
+                """
+                )
+                try:
+                    _ = self._write_conn.execute(
+                        "ALTER TABLE images DROP COLUMN placeholder"
+                    )
+                except sqlite3.OperationalError:
+                    # sqlite before 3.35 cannot drop columns
+                    _ = self._write_conn.execute("UPDATE images SET placeholder = NULL")
+
+    def _write_loop(self) -> None:
+        failures = 0
+        while True:
+            with self._cond:
+                while not (self._pending or self._flush_requested or self._closed):
+                    _ = self._cond.wait()
+
+                if failures:
+                    # back off while the disk or the database lock recovers, new
+                    # inserts and flushes wake us up too but only closing cuts it short
+                    while (
+                        not self._closed
+                        and (remaining := self._retry_at - time.monotonic()) > 0
+                    ):
+                        _ = self._cond.wait(remaining)
+                # give a burst of inserts the chance to land in one transaction
+                elif (
+                    self._pending
+                    and len(self._pending) < self.batch_size
+                    and not self._flush_requested
+                    and not self._closed
+                ):
+                    _ = self._cond.wait(self.flush_interval)
+
+                batch = list(self._pending.values())
+                accessed, self._accessed = self._accessed, {}
+                pins, self._pins = self._pins, {}
+                placeholders = dict(self._placeholders)
+                self._flush_requested = False
+                self._writing = True
+                closing = self._closed
+
+            error: Exception | None = None
+            try:
+                self._write_batch(batch, accessed, pins, placeholders)
+                failures = 0
+            except (OSError, sqlite3.Error) as e:
+                error = e
+                failures += 1
+                self._retry_at = time.monotonic() + min(
+                    WRITE_RETRY_MAX, WRITE_RETRY_DELAY * 2 ** (failures - 1)
+                )
+
+            with self._cond:
+                if error is None:
+                    for entry in batch:
+                        url = entry[0][0]
+                        if self._pending.get(url) is entry:
+                            del self._pending[url]
+                    for url, data in placeholders.items():
+                        if self._placeholders.get(url) is data:
+                            del self._placeholders[url]
+                else:
+                    # the rows are still pending, put back what was taken with them
+                    self.write_failures += 1
+                    for url, (at, hits) in accessed.items():
+                        later_at, later_hits = self._accessed.get(url, (at, 0))
+                        self._accessed[url] = (max(at, later_at), hits + later_hits)
+                    for url, pinned in pins.items():
+                        _ = self._pins.setdefault(url, pinned)
+
+                self._writing = False
+                self._cond.notify_all()
+
+            if error is not None:
+                player_log.handler(
+                    "error",
+                    "image-cache",
+                    f"writing {len(batch)} images failed, retrying: {error}",
+                )
+
+            if closing and (error is not None or not self._pending):
+                return
+
+    def _write_batch(
+        self,
+        batch: list[tuple[_ImageRow, bytes]],
+        accessed: dict[str, tuple[float, int]],
+        pins: dict[str, bool],
+        placeholders: dict[str, bytes],
+    ) -> None:
+        # evict() and remove_orphans() unlink files under the same lock, a blob
+        # that already exists here cannot disappear before its row commits
+        with self._write_lock:
+            # blobs first, so a committed row never points at a missing file
+            for row, data in batch:
+                self.blobs.put(row[6], data)
+
+            conn = self._write_conn
+            _ = conn.execute("BEGIN")
+            try:
+                _ = conn.executemany(_UPSERT_IMAGE, [row for row, _ in batch])
+                _ = conn.executemany(
+                    _UPDATE_ACCESS,
+                    [(at, hits, url) for url, (at, hits) in accessed.items()],
+                )
+                _ = conn.executemany(
+                    _UPDATE_PINNED,
+                    [(int(pinned), url) for url, pinned in pins.items()],
+                )
+                _ = conn.executemany(
+                    _UPSERT_PLACEHOLDER,
+                    [(url, data, time.time()) for url, data in placeholders.items()],
+                )
+                _ = conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    _ = conn.execute("ROLLBACK")
+                raise
+
+    # returns early when a write fails, the rows stay pending for the retry
+    def flush(self) -> None:
+        with self._cond:
+            failures = self.write_failures
+            self._flush_requested = True
+            self._cond.notify_all()
+            # a writer backing off has nothing to report before its next try
+            while (
+                (self._pending or self._flush_requested or self._writing)
+                and self._writer.is_alive()
+                and self.write_failures == failures
+                and self._retry_at <= time.monotonic()
+            ):
+                _ = self._cond.wait(self.flush_interval)
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+
+        self._io.shutdown()
+        self._writer.join()
+        self._write_conn.close()
+        self._read_conn.close()
+
+        with self._instances_lock:
+            _ = self._instances.pop(self.db_path, None)
+
+    def expiry_from_headers(self, headers: Mapping[str, str]) -> float:
+        now = time.time()
+        ttl = 0.0
+
+        cache_control = headers.get("Cache-Control", "")
+        if m := re.search(r"max-age=(\d+)", cache_control):
+            ttl = float(m.group(1))
+        elif expires := headers.get("Expires"):
+            try:
+                ttl = parsedate_to_datetime(expires).timestamp() - now
+            except (TypeError, ValueError):
+                pass
+
+        return now + max(ttl, self.min_ttl)
+
+    def get_cached_image(self, url: str) -> CachedImage | None:
+        return self.get_cached_images([url]).get(url)
+
+    def get_cached_images(self, urls: list[str]) -> dict[str, CachedImage]:
+        now = time.time()
+        self._last_activity = time.monotonic()
+        found: dict[str, CachedImage] = {}
+        missing: list[str] = []
+
+        with self._cond:
+            for url in urls:
+                _, hits = self._accessed.get(url, (0.0, 0))
+                self._accessed[url] = (now, hits + 1)
+
+                if (entry := self._pending.get(url)) is not None:
+                    row, data = entry
+                    found[url] = CachedImage(
+                        image_data=data,
+                        etag=row[1],
+                        last_modified=row[2],
+                        expires_at=row[7],
+                    )
+                else:
+                    missing.append(url)
+
+        rows: list[tuple[object, ...]] = []
+        with self._read_lock:
+            for i in range(0, len(missing), _SELECT_CHUNK):
+                chunk = missing[i : i + _SELECT_CHUNK]
+                rows += self._read_conn.execute(
+                    _SELECT_IMAGES.format(", ".join("?" * len(chunk))), chunk
+                ).fetchall()
+
+        for url, image_data, etag, last_modified, expires_at, digest in rows:
+            image_data = expect(image_data, bytes | None)
+            if image_data is None:
+                image_data = self.blobs.get(expect(digest, str))
+                if image_data is None:
+                    continue
+
+            found[expect(url, str)] = CachedImage(
+                image_data=image_data,
+                etag=expect(etag, str),
+                last_modified=expect(last_modified, str),
+                expires_at=expect(expires_at or 0, float),
+            )
+
+        return found
+
+    async def _run_io[T](self, fn: Callable[..., T], *args: object) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    async def get_cached_images_async(self, urls: list[str]) -> dict[str, CachedImage]:
+        return await self._run_io(self.get_cached_images, urls)
+
+    # lookups made in the same loop iteration go to the I/O thread as one query
+    async def get_cached_image_async(self, url: str) -> CachedImage | None:
+        future: asyncio.Future[CachedImage | None] = (
+            asyncio.get_running_loop().create_future()
+        )
+
+        if self._lookups is None:
+            self._lookups = {}
+            _ = asyncio.get_running_loop().call_soon(self._dispatch_lookups)
+        self._lookups.setdefault(url, []).append(future)
+
+        return await future
+
+    def _dispatch_lookups(self) -> None:
+        lookups, self._lookups = self._lookups or {}, None
+
+        async def run() -> None:
+            try:
+                found = await self.get_cached_images_async(list(lookups))
+            except Exception as e:
+                for futures in lookups.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                return
+
+            for url, futures in lookups.items():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(found.get(url))
+
+        self._lookup_task = asyncio.ensure_future(run())
+
+    def refresh_expiry(self, url: str, expires_at: float) -> None:
+        with self._cond:
+            if (entry := self._pending.get(url)) is not None:
+                row, data = entry
+                self._pending[url] = ((*row[:7], expires_at, *row[8:]), data)
+                return
+
+        with self._write_lock:
+            _ = self._write_conn.execute(_UPDATE_EXPIRY, (expires_at, url))
+
+    def get_failure(self, url: str) -> FetchFailure | None:
+        failure = self._failures.get(url)
+        if failure is None or failure.retry_at <= time.time():
+            return None
+        return failure
+
+    def get_placeholders(self, urls: list[str]) -> dict[str, bytes]:
+        found: dict[str, bytes] = {}
+        missing: list[str] = []
+
+        with self._cond:
+            for url in urls:
+                if (data := self._placeholders.get(url)) is not None:
+                    found[url] = data
+                else:
+                    missing.append(url)
+
+        with self._read_lock:
+            for i in range(0, len(missing), _SELECT_CHUNK):
+                chunk = missing[i : i + _SELECT_CHUNK]
+                for url, data in self._read_conn.execute(
+                    _SELECT_PLACEHOLDERS.format(", ".join("?" * len(chunk))), chunk
+                ):
+                    found[expect(url, str)] = expect(data, bytes)
+
+        return found
+
+    async def get_placeholders_async(self, urls: list[str]) -> dict[str, bytes]:
+        return await self._run_io(self.get_placeholders, urls)
+
+    async def refresh_expiry_async(self, url: str, expires_at: float) -> None:
+        await self._run_io(self.refresh_expiry, url, expires_at)
+
+    def record_failure(self, url: str, reason: str, status: int | None = None) -> None:
+        now = time.time()
+        previous = self._failures.get(url)
+        attempts = previous.attempts + 1 if previous else 1
+
+        step = attempts - 1
+        if status in self.PERMANENT_STATUSES:
+            step += len(self.FAILURE_BACKOFF) - 2
+        delay = self.FAILURE_BACKOFF[min(step, len(self.FAILURE_BACKOFF) - 1)]
+
+        failure = FetchFailure(reason, attempts, now + delay)
+        self._failures[url] = failure
+
+        with self._write_lock:
+            _ = self._write_conn.execute(
+                "INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?, ?)",
+                (url, reason, attempts, now, failure.retry_at),
+            )
+
+    async def record_failure_async(
+        self, url: str, reason: str, status: int | None = None
+    ) -> None:
+        await self._run_io(self.record_failure, url, reason, status)
+
+    def clear_failure(self, url: str) -> None:
+        if self._failures.pop(url, None) is None:
+            return
+
+        with self._write_lock:
+            _ = self._write_conn.execute("DELETE FROM failures WHERE url = ?", (url,))
 
     def update_cache(
         self,
@@ -163,56 +987,264 @@ class ImageCache:
         image_data: bytes,
         etag: str | None,
         last_modified: str | None,
+        expires_at: float | None = None,
     ) -> None:
         image_hash = hashlib.md5(image_data).hexdigest()
+        if expires_at is None:
+            expires_at = time.time() + self.min_ttl
 
-        with sqlite3.connect(self.db_path) as conn:
-            _ = conn.execute(
-                """
-                INSERT OR REPLACE INTO images 
-                (url, etag, last_modified, width, height, image_data, downloaded_at, hash)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    network_image.url,
-                    etag,
-                    last_modified,
-                    network_image.width,
-                    network_image.height,
-                    image_data,
-                    datetime.now().isoformat(),
-                    image_hash,
-                ),
+        row: _ImageRow = (
+            network_image.url,
+            etag,
+            last_modified,
+            network_image.width,
+            network_image.height,
+            datetime.now().isoformat(),
+            image_hash,
+            expires_at,
+            len(image_data),
+        )
+        placeholder = make_placeholder(image_data)
+        self._last_activity = time.monotonic()
+
+        self.clear_failure(network_image.url)
+        with self._cond:
+            self._pending[network_image.url] = (row, image_data)
+            # only reached while writes keep failing, the oldest are fetched again later
+            while len(self._pending) > self.max_pending:
+                del self._pending[next(iter(self._pending))]
+            if placeholder is not None:
+                self._placeholders[network_image.url] = placeholder
+            self._cond.notify_all()
+
+    async def update_cache_async(
+        self,
+        network_image: NetworkImage,
+        image_data: bytes,
+        etag: str | None,
+        last_modified: str | None,
+        expires_at: float | None = None,
+    ) -> None:
+        await self._run_io(
+            self.update_cache,
+            network_image,
+            image_data,
+            etag,
+            last_modified,
+            expires_at,
+        )
+
+    def pin(self, urls: list[str], pinned: bool = True) -> None:
+        with self._cond:
+            for url in urls:
+                self._pins[url] = pinned
+            self._flush_requested = True
+            self._cond.notify_all()
+
+    def unpin(self, urls: list[str]) -> None:
+        self.pin(urls, pinned=False)
+
+    # returns the number of evicted urls and the bytes freed on disk
+    def evict(self) -> tuple[int, int]:
+        self.flush()
+
+        order = (
+            "hits ASC, COALESCE(last_access, 0) ASC"
+            if self.policy == "lfu"
+            else "COALESCE(last_access, 0) ASC"
+        )
+
+        with self._write_lock:
+            conn = self._write_conn
+            refs = {
+                expect(digest, str): expect(count, int)
+                for digest, count in conn.execute(
+                    "SELECT hash, COUNT(*) FROM images GROUP BY hash"
+                )
+            }
+            total = expect(conn.execute(_BLOB_BYTES).fetchone()[0] or 0, int)
+            if total <= self.max_bytes:
+                return 0, 0
+
+            candidates = conn.execute(
+                f"SELECT url, hash, size FROM images WHERE pinned = 0 ORDER BY {order}"
+            ).fetchall()
+
+            evicted: list[str] = []
+            freed = 0
+            for url, digest, size in candidates:
+                if total - freed <= self.max_bytes:
+                    break
+
+                evicted.append(url)
+                refs[digest] -= 1
+                if refs[digest] == 0:
+                    freed += size or 0
+                    self.blobs.delete(digest)
+
+            _ = conn.execute("BEGIN")
+            _ = conn.executemany(
+                "DELETE FROM images WHERE url = ?", [(url,) for url in evicted]
+            )
+            _ = conn.execute("COMMIT")
+
+        return len(evicted), freed
+
+    # rows from before the BlobStore keep their bytes inline until moved here
+    def migrate_inline_images(self, batch_size: int = 64) -> int:
+        migrated = 0
+        while True:
+            # one batch per lock hold, so the writer and lookups get in between
+            with self._write_lock:
+                conn = self._write_conn
+                rows = conn.execute(_SELECT_INLINE, (batch_size,)).fetchall()
+                if not rows:
+                    return migrated
+
+                updates: list[tuple[str, int, str]] = []
+                for url, image_data in rows:
+                    data = bytes(expect(image_data, bytes))
+                    digest = hashlib.md5(data).hexdigest()
+                    self.blobs.put(digest, data)
+                    updates.append((digest, len(data), expect(url, str)))
+
+                _ = conn.execute("BEGIN")
+                try:
+                    _ = conn.executemany(_MOVE_INLINE, updates)
+                    _ = conn.execute("COMMIT")
+                except BaseException:
+                    if conn.in_transaction:
+                        _ = conn.execute("ROLLBACK")
+                    raise
+
+            migrated += len(rows)
+
+    def remove_orphans(self, min_age: float = 60 * 60) -> int:
+        # young files may belong to rows the writer has not committed yet
+        self.flush()
+
+        removed = 0
+        now = time.time()
+        with self._write_lock:
+            referenced = {
+                expect(row[0], str)
+                for row in self._write_conn.execute("SELECT DISTINCT hash FROM images")
+            }
+
+            for digest in self.blobs.digests() - referenced:
+                try:
+                    if now - self.blobs.path(digest).stat().st_mtime < min_age:
+                        continue
+                except FileNotFoundError:
+                    continue
+
+                self.blobs.delete(digest)
+                removed += 1
+
+        return removed
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self._last_activity
+
+    def incremental_vacuum(self, pages: int = 256) -> None:
+        with self._write_lock:
+            mode = expect(
+                self._write_conn.execute("PRAGMA auto_vacuum").fetchone()[0], int
+            )
+            if mode != 2:
+                # switching modes needs one full VACUUM, which holds the write lock
+                # throughout, so it waits for a quiet moment
+                if self.idle_for() < IDLE_BEFORE_VACUUM:
+                    return
+                _ = self._write_conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                _ = self._write_conn.execute("VACUUM")
+                return
+
+            _ = self._write_conn.execute(f"PRAGMA incremental_vacuum({pages})")
+
+    def prune_placeholders(self, max_age: float = PLACEHOLDER_MAX_AGE) -> int:
+        with self._write_lock:
+            cursor = self._write_conn.execute(
+                "DELETE FROM placeholders WHERE updated_at < ?",
+                (time.time() - max_age,),
             )
-            conn.commit()
+        return cursor.rowcount
+
+    def check_integrity(self) -> str:
+        with self._read_lock:
+            rows = self._read_conn.execute("PRAGMA quick_check").fetchall()
+        return "; ".join(str(row[0]) for row in rows)
+
+    class MaintenanceReport(TypedDict):
+        migrated: int
+        evicted: int
+        freed_bytes: int
+        orphans_removed: int
+        placeholders_pruned: int
+        integrity: str
+
+    def maintain(self, vacuum_pages: int = 256) -> MaintenanceReport:
+        migrated = self.migrate_inline_images()
+        evicted, freed = self.evict()
+        orphans = self.remove_orphans()
+        placeholders = self.prune_placeholders()
+        self.incremental_vacuum(vacuum_pages)
+
+        return {
+            "migrated": migrated,
+            "evicted": evicted,
+            "freed_bytes": freed,
+            "orphans_removed": orphans,
+            "placeholders_pruned": placeholders,
+            "integrity": self.check_integrity(),
+        }
 
     def clear_cache(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            _ = conn.execute("DELETE FROM images")
-            conn.commit()
+        self.flush()
+
+        with self._write_lock:
+            _ = self._write_conn.execute("DELETE FROM images")
+            _ = self._write_conn.execute("DELETE FROM failures")
+            _ = self._write_conn.execute("DELETE FROM placeholders")
+            self.blobs.clear()
+        self._failures.clear()
 
     class CacheStats(TypedDict):
         total_images: int
         total_size_bytes: int
         oldest_image: str
         newest_image: str
+        failed_urls: int
+        webp_size_bytes: int
+        # estimated from the bytes per pixel of the cached jpegs
+        webp_bytes_saved: int
 
     def get_cache_stats(self) -> CacheStats:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
-                """
-                SELECT 
+        self.flush()
+
+        with self._read_lock:
+            cursor = self._read_conn.execute(
+                f"""
+                SELECT
                     COUNT(*) as total_images,
-                    SUM(LENGTH(image_data)) as total_size,
+                    ({_BLOB_BYTES}) as total_size,
                     MIN(downloaded_at) as oldest_image,
                     MAX(downloaded_at) as newest_image
                 FROM images
             """
             )
             stats = expect(cursor.fetchone(), list[object])
-            return {
-                "total_images": expect(stats[0], int),
-                "total_size_bytes": expect(stats[1], int),
-                "oldest_image": expect(stats[2], str),
-                "newest_image": expect(stats[3], str),
-            }
+            webp_bytes, webp_pixels, jpeg_bpp = self._read_conn.execute(
+                _WEBP_SAVINGS
+            ).fetchone()
+
+        saved = webp_pixels * jpeg_bpp - webp_bytes if jpeg_bpp else 0
+        return {
+            "total_images": expect(stats[0], int),
+            "total_size_bytes": expect(stats[1], int),
+            "oldest_image": expect(stats[2], str),
+            "newest_image": expect(stats[3], str),
+            "failed_urls": len(self._failures),
+            "webp_size_bytes": expect(webp_bytes, int),
+            "webp_bytes_saved": max(0, int(saved)),
+        }
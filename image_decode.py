@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from typing import Callable, final
+
+import asyncio
+import os
+
+
+@final
+class DecodePool:
+    # PIL releases the GIL while decoding and resampling, threads are enough
+    def __init__(self, workers: int = min(4, os.cpu_count() or 1)) -> None:
+        self.workers = workers
+        self._executor: ThreadPoolExecutor | None = None
+
+    def decode(self, image: Image.Image, target_height: int) -> Image.Image:
+        width, height = image.size
+        if target_height <= 0 or height <= target_height:
+            image.load()
+            return image
+
+        size = (max(1, width * target_height // height), target_height)
+
+        # JPEG decodes straight at 1/2, 1/4 or 1/8 scale, never below size
+        _ = image.draft("RGB", size)
+        image.load()
+
+        # reduce() is a cheap box filter, leave the last step to a proper resample
+        factor = image.height // target_height
+        if factor >= 2:
+            image = image.reduce(factor)
+        if image.height > target_height:
+            image = image.resize(size, Image.Resampling.BILINEAR)
+
+        return image
+
+    async def run[T](self, fn: Callable[..., T], *args: object) -> T:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="ImageDecodeThread"
+            )
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, fn, *args
+        )
+
+    async def decode_async(self, image: Image.Image, target_height: int) -> Image.Image:
+        return await self.run(self.decode, image, target_height)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+shared_decoder = DecodePool()
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from collections.abc import Callable
+from copy import deepcopy
+from dataclasses import dataclass
+from threading import Lock
+from typing import final
+from urllib.parse import parse_qs, urlsplit
+
+import time
+
+type Info = dict[str, object]
+
+
+@dataclass
+class _Entry:
+    info: Info
+    expires_at: float
+
+
+@final
+class InfoCache:
+    def __init__(
+        self, capacity: int = 64, ttl: float = 60 * 60, margin: float = 5 * 60
+    ) -> None:
+        self.capacity = capacity
+        self.ttl = ttl
+        # leave time to start playing before the urls stop working
+        self.margin = margin
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = Lock()
+        self._extracting: dict[str, Lock] = {}
+
+    def expires_at(self, info: Info) -> float:
+        # googlevideo urls carry their own expiry, the earliest one decides
+        expiries: list[float] = []
+        formats = info.get("formats")
+        for fmt in formats if isinstance(formats, list) else []:
+            url = fmt.get("url") if isinstance(fmt, dict) else None
+            if isinstance(url, str):
+                expire = parse_qs(urlsplit(url).query).get("expire")
+                if expire and expire[0].isdigit():
+                    expiries.append(float(expire[0]))
+
+        if expiries:
+            return min(expiries) - self.margin
+        return time.time() + self.ttl
+
+    def _fresh(self, video_id: str) -> Info | None:
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None or entry.expires_at <= time.time():
+                _ = self._entries.pop(video_id, None)
+                return None
+            self._entries.move_to_end(video_id)
+
+        # yt-dlp fills in format selection and filenames in place
+        return deepcopy(entry.info)
+
+    def get(self, video_id: str) -> Info | None:
+        info = self._fresh(video_id)
+        with self._lock:
+            if info is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return info
+
+    def put(self, video_id: str, info: Info) -> None:
+        entry = _Entry(deepcopy(info), self.expires_at(info))
+        with self._lock:
+            self._entries[video_id] = entry
+            self._entries.move_to_end(video_id)
+            while len(self._entries) > self.capacity:
+                _ = self._entries.popitem(last=False)
+
+    def get_or_extract(self, video_id: str, extract: Callable[[], Info]) -> Info:
+        if (info := self.get(video_id)) is not None:
+            return info
+
+        with self._lock:
+            lock = self._extracting.setdefault(video_id, Lock())
+
+        # threads asking for the same video wait for one extraction
+        with lock:
+            if (info := self._fresh(video_id)) is not None:
+                return info
+
+            try:
+                info = extract()
+                self.put(video_id, info)
+            finally:
+                with self._lock:
+                    _ = self._extracting.pop(video_id, None)
+
+        return info
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+shared_info_cache = InfoCache()
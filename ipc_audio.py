@@ -0,0 +1,323 @@
+from collections.abc import Mapping
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Callable, final
+
+import asyncio
+import atexit
+import itertools
+import json
+import os
+import socket
+import stat
+import subprocess
+import tempfile
+import time
+
+from player_log import player_log
+from utils import expect
+from ytdl_cache import shared_ytdl_cache
+
+
+@final
+class IPCAudioPlayer:
+    def __init__(
+        self,
+        filepath: str | None = None,
+        buffer_size: str = "100K",
+        mpv_path: str = "mpv",
+        timeout: float = 5.0,
+        daemon: bool = False,
+        loglevel: str = "warn",
+    ) -> None:
+        self.filepath = filepath
+        self.timeout = timeout
+        self.daemon = daemon
+        self.socket_path = (
+            self.daemon_socket_path()
+            if daemon
+            else os.path.join(self.private_dir(), f"mpv-{os.getpid()}.sock")
+        )
+
+        self._lock = Lock()
+        self._request_ids = itertools.count(1)
+        self._observe_ids = itertools.count(1)
+        self._pending: dict[int, Future[object]] = {}
+        self._observers: dict[int, Callable[[object], None]] = {}
+
+        self.process: subprocess.Popen[bytes] | None = None
+        sock = self._try_connect() if daemon else None
+        if sock is None:
+            self.process = self._spawn(mpv_path, buffer_size)
+            sock = self._connect()
+
+        # a daemon outlives us, only drop the connection on exit
+        _ = atexit.register(self.close if daemon else self.terminate)
+
+        self.sock = sock
+        self._reader = Thread(
+            target=self._read_loop, name="MPVIPCReaderThread", daemon=True
+        )
+        self._reader.start()
+
+        _ = self._send("request_log_messages", loglevel)
+
+    # the shared temp dir is world writable, anyone could plant a socket under a fixed name
+    @staticmethod
+    def private_dir() -> str:
+        path = os.path.join(tempfile.gettempdir(), f"youtube-tui-{os.getuid()}")
+        os.makedirs(path, mode=0o700, exist_ok=True)
+
+        st = os.lstat(path)
+        if (
+            not stat.S_ISDIR(st.st_mode)
+            or st.st_uid != os.getuid()
+            or stat.S_IMODE(st.st_mode) & 0o077
+        ):
+            raise PermissionError(f"{path!r} is not a private directory of this user")
+        return path
+
+    @staticmethod
+    def daemon_socket_path() -> str:
+        runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or IPCAudioPlayer.private_dir()
+        return os.path.join(runtime_dir, "youtube-tui-mpv.sock")
+
+    @staticmethod
+    def check_owner(path: str) -> None:
+        st = os.lstat(path)
+        if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+            raise PermissionError(f"{path!r} is not a socket owned by this user")
+
+    @staticmethod
+    def stop_daemon() -> bool:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            path = IPCAudioPlayer.daemon_socket_path()
+            IPCAudioPlayer.check_owner(path)
+            sock.connect(path)
+            sock.sendall(b'{"command": ["quit"]}\n')
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.close()
+
+    def _spawn(self, mpv_path: str, buffer_size: str) -> subprocess.Popen[bytes]:
+        return subprocess.Popen(
+            [
+                mpv_path,
+                "--idle=yes",
+                "--no-terminal",
+                "--vid=no",
+                "--ytdl=yes",
+                f"--ytdl-raw-options={shared_ytdl_cache.mpv_raw_options()}",
+                f"--demuxer-max-bytes={buffer_size}",
+                f"--input-ipc-server={self.socket_path}",
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            # keep the daemon alive when the terminal that started it goes away
+            start_new_session=self.daemon,
+        )
+
+    def _try_connect(self) -> socket.socket | None:
+        try:
+            self.check_owner(self.socket_path)
+        except FileNotFoundError:
+            return None
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+            return sock
+        except (FileNotFoundError, ConnectionRefusedError):
+            sock.close()
+            return None
+
+    def _connect(self) -> socket.socket:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if self.process and self.process.poll() is not None:
+                raise RuntimeError(
+                    f"mpv exited with code {self.process.returncode} before IPC was ready"
+                )
+
+            if sock := self._try_connect():
+                return sock
+
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"mpv IPC socket {self.socket_path!r} did not come up"
+                )
+            time.sleep(0.02)
+
+    def _read_loop(self) -> None:
+        with self.sock.makefile("rb") as f:
+            for line in f:
+                try:
+                    msg = expect(json.loads(line), dict[str, object])
+                except ValueError:
+                    continue
+
+                if "request_id" in msg:
+                    with self._lock:
+                        future = self._pending.pop(expect(msg["request_id"], int), None)
+                    # a cancelled await cancels the future, its late reply is dropped
+                    if future is None or not future.set_running_or_notify_cancel():
+                        continue
+
+                    if msg.get("error") == "success":
+                        future.set_result(msg.get("data"))
+                    else:
+                        future.set_exception(RuntimeError(msg.get("error")))
+
+                elif msg.get("event") == "log-message":
+                    player_log.handler(
+                        expect(msg.get("level", ""), str),
+                        expect(msg.get("prefix", ""), str),
+                        expect(msg.get("text", ""), str),
+                    )
+
+                elif msg.get("event") == "property-change":
+                    handler = self._observers.get(expect(msg.get("id"), int))
+                    if handler:
+                        handler(msg.get("data"))
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(ConnectionError("mpv IPC connection closed"))
+
+    def _send(self, *args: object) -> Future[object]:
+        future: Future[object] = Future()
+        request_id = next(self._request_ids)
+        payload = json.dumps({"command": args, "request_id": request_id}) + "\n"
+
+        with self._lock:
+            self._pending[request_id] = future
+            self.sock.sendall(payload.encode("utf-8"))
+
+        return future
+
+    def command(self, *args: object) -> object:
+        return self._send(*args).result(self.timeout)
+
+    async def command_async(self, *args: object) -> object:
+        return await asyncio.wrap_future(self._send(*args))
+
+    def get_property(self, name: str) -> object:
+        try:
+            return self.command("get_property", name)
+        except RuntimeError:
+            # "property unavailable", mirrors python-mpv returning None
+            return None
+
+    async def get_property_async(self, name: str) -> object:
+        try:
+            return await self.command_async("get_property", name)
+        except RuntimeError:
+            return None
+
+    async def set_user_data_async(self, key: str, value: object) -> None:
+        _ = await self.command_async(
+            "set_property", f"user-data/youtube-tui/{key}", json.dumps(value)
+        )
+
+    async def get_user_data_async(self, key: str) -> object:
+        value = await self.get_property_async(f"user-data/youtube-tui/{key}")
+        return json.loads(expect(value, str)) if value else None
+
+    # a list value keeps commas inside the headers intact
+    async def set_http_headers_async(self, headers: Mapping[str, str]) -> None:
+        _ = await self.command_async(
+            "set_property",
+            "http-header-fields",
+            [f"{name}: {value}" for name, value in headers.items()],
+        )
+
+    def register_callback(self, event: str, fn: Callable[[object], None]) -> None:
+        observe_id = next(self._observe_ids)
+        self._observers[observe_id] = fn
+        _ = self._send("observe_property", observe_id, event)
+
+    def play(self) -> None:
+        _ = self.command("loadfile", self.filepath)
+        self.resume()
+
+    async def play_async(self) -> None:
+        _ = await self.command_async("loadfile", self.filepath)
+        await self.resume_async()
+
+    def seek_to(self, s: float) -> None:
+        _ = self._send("seek", s, "absolute")
+
+    def seek(self, offset: float) -> None:
+        _ = self._send("seek", offset)
+
+    # a reply only says the property was set, the bridge reports the new state
+    def pause(self) -> None:
+        _ = self._send("set_property", "pause", True)
+
+    def resume(self) -> None:
+        _ = self._send("set_property", "pause", False)
+
+    async def pause_async(self) -> None:
+        _ = await self.command_async("set_property", "pause", True)
+
+    async def resume_async(self) -> None:
+        _ = await self.command_async("set_property", "pause", False)
+
+    async def is_paused_async(self) -> bool:
+        return expect(await self.get_property_async("pause"), bool)
+
+    async def toggle_playback_async(self) -> bool:
+        _ = await self.command_async("cycle", "pause")
+        return expect(await self.get_property_async("pause"), bool)
+
+    def stop(self) -> None:
+        _ = self.command("stop")
+
+    @property
+    def attached(self) -> bool:
+        return self.process is None
+
+    def close(self) -> None:
+        try:
+            # wakes the reader thread, which holds its own reference to the socket
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def terminate(self) -> None:
+        if self.process and self.process.poll() is not None:
+            return
+
+        try:
+            _ = self.command("quit")
+            if self.process:
+                _ = self.process.wait(self.timeout)
+        except (RuntimeError, OSError, TimeoutError, subprocess.TimeoutExpired):
+            if self.process:
+                self.process.kill()
+        finally:
+            self.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def update(self, filepath: str) -> None:
+        self.filepath = filepath
+
+    def get_duration(self) -> float:
+        return expect(self.get_property("duration"), float)
+
+    def get_current_time(self) -> float:
+        return expect(self.get_property("time-pos"), float)
+
+    async def get_duration_async(self) -> float:
+        return expect(await self.get_property_async("duration"), float)
+
+    async def get_current_time_async(self) -> float:
+        return expect(await self.get_property_async("time-pos"), float)
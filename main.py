@@ -1,4 +1,8 @@
+# first, so the timeline also covers the imports below
+from startup import shared_timeline
+
 from textual import on, work
+from textual.worker import get_current_worker
 from textual.app import App, ComposeResult
 from textual.binding import Binding
 from textual.containers import HorizontalScroll, VerticalGroup
@@ -7,14 +11,35 @@ from textual.validation import Length
 from typing import final, override
 from rich.markup import escape
 
+import argparse
+import asyncio
 import shelve
-
-from view import YoutubeVideosView, YoutubePlayer, SettingPopup
+import time
+
+from view import (
+    YoutubeVideosView,
+    YoutubePlayer,
+    SettingPopup,
+    PlayerLogScreen,
+    load_kakasi,
+)
 from api import YoutubeAPI
 from persistent import shared_db
+from ipc_audio import IPCAudioPlayer
+from player_log import player_log
+from http_client import shared_http
+from image import ImageCache
+from image_decode import shared_decoder
+from prewarm import Prewarmer, WarmTiming
+from render_cache import shared_render_cache
+from utils import lower_thread_priority
+from ytdl_cache import shared_ytdl_cache
+
+shared_timeline.mark("imports")
 
 
 DEBUG_DATA = False
+CACHE_MAINTENANCE_INTERVAL = 10 * 60
 
 
 @final
@@ -30,6 +55,7 @@ class Youtube(App[None]):
         Binding("left", "seek(-5)", "Seek -5 seconds"),
         Binding("space", "toggle_playback", "Toggle play/pause"),
         Binding(":", "open_setting", "Open setting"),
+        Binding("L", "open_log", "Open player log"),
     ]
 
     CSS = """
@@ -137,6 +163,8 @@ class Youtube(App[None]):
     def __init__(self) -> None:
         super().__init__()
 
+        self.prewarm_report: list[WarmTiming] = []
+
     @override
     def compose(self) -> ComposeResult:
         with VerticalGroup(classes="header"):
@@ -151,11 +179,66 @@ class Youtube(App[None]):
             )
         yield YoutubeVideosView()
         yield YoutubePlayer()
+        shared_timeline.mark("compose")
+
+    def on_mount(self) -> None:
+        shared_timeline.mark("mount")
+        self.call_after_refresh(self.first_frame)
+        self.maintain_cache()
+
+    def first_frame(self) -> None:
+        shared_timeline.mark("first frame")
+        self.prewarm()
+
+    # after the first frame, imports in other threads would hold the gil while it draws
+    @work(exclusive=True, group="prewarm")
+    async def prewarm(self) -> None:
+        _, _, self.prewarm_report = await asyncio.gather(
+            self.query_one(YoutubePlayer).get_player(),
+            asyncio.to_thread(load_kakasi),
+            Prewarmer().run(),
+        )
+        shared_timeline.mark("prewarm")
+
+    @work(thread=True, exclusive=True, group="cache-maintenance")
+    def maintain_cache(self) -> None:
+        lower_thread_priority()
+        worker = get_current_worker()
+
+        cache = ImageCache()
+        cache.max_bytes = int(shared_db.get("image_cache_max_mb", 512)) * 1024 * 1024
+        if shared_db.get("image_cache_policy", "lru") == "lfu":
+            cache.policy = "lfu"
+
+        while not worker.is_cancelled:
+            _ = shared_render_cache.prune_disk()
+            report = cache.maintain()
+            if report["integrity"] != "ok":
+                self.call_from_thread(
+                    self.notify,
+                    report["integrity"],
+                    title="Image cache is corrupted",
+                    severity="error",
+                )
+                return
+
+            for _ in range(CACHE_MAINTENANCE_INTERVAL):
+                if worker.is_cancelled:
+                    return
+                time.sleep(1)
+
+    async def on_unmount(self) -> None:
+        await shared_http.close()
+        shared_decoder.shutdown()
 
     @work
     async def action_open_setting(self) -> None:
         await self.push_screen_wait(SettingPopup())
 
+    @work
+    async def action_open_log(self) -> None:
+        await self.push_screen_wait(PlayerLogScreen())
+
     def action_focus_input(self) -> None:
         _ = self.query_one(Input).focus()
 
@@ -197,6 +280,8 @@ class Youtube(App[None]):
     @on(YoutubeVideosView.RequestPlay)
     def play(self, ev: YoutubeVideosView.RequestPlay) -> None:
         self.query_one(YoutubePlayer).video = ev.video
+        # played videos are history, keep their thumbnails out of eviction
+        ImageCache().pin([thumbnail.url for thumbnail in ev.video.thumbnails])
 
     def action_seek(self, s: int) -> None:
         self.query_one(YoutubePlayer).seek(s)
@@ -213,8 +298,50 @@ def default_db() -> None:
     set("outdir", "~")
     set("max_search", 5)
     set("format", "bestaudio[ext=m4a]")
+    set("player_backend", "libmpv")
+    set("player_daemon", False)
+    set("mpv_loglevel", "warn")
+    set("mpv_logfile", "")
+    set("image_cache_max_mb", 512)
+    set("image_cache_policy", "lru")
+    set("render_cache_disk", False)
+    set("render_cache_disk_max_mb", 64)
+    set("ytdl_cachedir", "ytdl_cache")
 
 
 if __name__ == "__main__":
-    default_db()
-    Youtube().run()
+    parser = argparse.ArgumentParser()
+    _ = parser.add_argument(
+        "--stop-daemon",
+        action="store_true",
+        help="stop the background player started by the 'player_daemon' setting",
+    )
+    _ = parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="print import, compose and first frame timings on exit",
+    )
+    args = parser.parse_args()
+
+    if args.stop_daemon:
+        if not IPCAudioPlayer.stop_daemon():
+            print("No player daemon is running")
+    else:
+        default_db()
+        if logfile := shared_db.get("mpv_logfile", ""):
+            player_log.enable_file(logfile)
+        if shared_db.get("render_cache_disk", False):
+            shared_render_cache.max_disk_bytes = (
+                int(shared_db.get("render_cache_disk_max_mb", 64)) * 1024 * 1024
+            )
+            shared_render_cache.enable_disk("render_cache")
+        shared_ytdl_cache.set_root(shared_db.get("ytdl_cachedir", "ytdl_cache"))
+
+        app = Youtube()
+        app.run()
+
+        if args.startup_report:
+            print(shared_timeline.report())
+            for timing in app.prewarm_report:
+                error = f" ({timing.error})" if timing.error else ""
+                print(f"{timing.seconds * 1000:8.1f}ms  warm {timing.target}{error}")
@@ -4,6 +4,13 @@ from enum import Enum, auto
 from image import NetworkImage
 
 
+@dataclass
+class MediaSource:
+    url: str
+    # yt-dlp's headers, the media host may refuse requests without them
+    http_headers: dict[str, str]
+
+
 @dataclass
 class YoutubeVideo:
     class Status(Enum):
@@ -0,0 +1,25 @@
+from PIL import Image
+
+import io
+
+# a few pixels of colour, stretched over the row until the thumbnail arrives
+MAX_SIDE = 8
+
+
+def make_placeholder(image_data: bytes) -> bytes | None:
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        _ = image.draft("RGB", (MAX_SIDE, MAX_SIDE))
+        image = image.convert("RGB")
+    except (OSError, ValueError):
+        return None
+
+    image.thumbnail((MAX_SIDE, MAX_SIDE), Image.Resampling.BOX)
+    # two bytes of size, then the raw pixels
+    return bytes((image.width, image.height)) + image.tobytes()
+
+
+def placeholder_image(data: bytes) -> Image.Image | None:
+    if len(data) < 2 or len(data) != 2 + data[0] * data[1] * 3:
+        return None
+    return Image.frombytes("RGB", (data[0], data[1]), data[2:])
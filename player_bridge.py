@@ -0,0 +1,58 @@
+from textual import constants
+from textual.message import Message
+from textual.message_pump import MessagePump
+from threading import Lock
+from typing import final
+
+import asyncio
+
+from audio import AudioPlayer
+from ipc_audio import IPCAudioPlayer
+
+
+@final
+class PlayerBridge:
+    @final
+    class Changed(Message, bubble=False):
+        def __init__(self, state: dict[str, object]) -> None:
+            super().__init__()
+
+            self.state = state
+
+    def __init__(self, target: MessagePump, fps: int = constants.MAX_FPS) -> None:
+        self.target = target
+        self.frame = 1 / fps
+
+        self._loop = asyncio.get_running_loop()
+        self._lock = Lock()
+        self._pending: dict[str, object] = {}
+        self._scheduled = False
+        self._last_flush = 0.0
+
+    def attach(self, player: AudioPlayer | IPCAudioPlayer, *properties: str) -> None:
+        for name in properties:
+            player.register_callback(
+                name, fn=lambda value, name=name: self.update(name, value)
+            )
+
+    def update(self, name: str, value: object) -> None:
+        with self._lock:
+            self._pending[name] = value
+            if self._scheduled:
+                return
+            self._scheduled = True
+
+        _ = self._loop.call_soon_threadsafe(self._schedule_flush)
+
+    def _schedule_flush(self) -> None:
+        delay = max(0.0, self._last_flush + self.frame - self._loop.time())
+        _ = self._loop.call_later(delay, self._flush)
+
+    def _flush(self) -> None:
+        with self._lock:
+            state, self._pending = self._pending, {}
+            self._scheduled = False
+
+        self._last_flush = self._loop.time()
+        if state:
+            _ = self.target.post_message(PlayerBridge.Changed(state))
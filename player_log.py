@@ -0,0 +1,97 @@
+from collections import deque
+from dataclasses import dataclass
+from logging.handlers import QueueListener, RotatingFileHandler
+from pathlib import Path
+from queue import SimpleQueue
+from threading import Lock
+from typing import final
+
+import atexit
+import logging
+import time
+
+MPV_LEVELS = {
+    "fatal": logging.CRITICAL,
+    "error": logging.ERROR,
+    "warn": logging.WARNING,
+    "info": logging.INFO,
+    "v": logging.DEBUG,
+    "debug": logging.DEBUG,
+    "trace": logging.DEBUG,
+}
+
+
+@dataclass
+class LogEntry:
+    time: float
+    level: str
+    component: str
+    message: str
+
+
+@final
+class PlayerLog:
+    def __init__(self, capacity: int = 1000) -> None:
+        self.entries: deque[LogEntry] = deque(maxlen=capacity)
+        self.total = 0
+
+        self._lock = Lock()
+        self._queue: SimpleQueue[logging.LogRecord] | None = None
+        self._listener: QueueListener | None = None
+
+    # called from mpv's event thread, keep it cheap
+    def handler(self, level: str, component: str, message: str) -> None:
+        entry = LogEntry(time.time(), level, component, message.rstrip())
+        with self._lock:
+            self.entries.append(entry)
+            self.total += 1
+
+        if (queue := self._queue) is not None:
+            queue.put_nowait(
+                logging.makeLogRecord(
+                    {
+                        "name": component,
+                        "levelno": MPV_LEVELS.get(level, logging.INFO),
+                        "levelname": level,
+                        "msg": entry.message,
+                        "created": entry.time,
+                    }
+                )
+            )
+
+    def since(self, seen: int) -> tuple[list[LogEntry], int]:
+        with self._lock:
+            count = min(self.total - seen, len(self.entries))
+            new = list(self.entries)[len(self.entries) - count :]
+            return new, self.total
+
+    def enable_file(
+        self, path: str | Path, max_bytes: int = 1 << 20, backup_count: int = 3
+    ) -> None:
+        if self._listener is not None:
+            return
+
+        file_handler = RotatingFileHandler(
+            Path(path).expanduser(), maxBytes=max_bytes, backupCount=backup_count
+        )
+        file_handler.setFormatter(
+            logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+        )
+
+        self._queue = SimpleQueue()
+        self._listener = QueueListener(self._queue, file_handler)
+        self._listener.start()
+        _ = atexit.register(self.disable_file)
+
+    def disable_file(self) -> None:
+        if self._listener is None:
+            return
+
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+        self._queue = None
+
+
+player_log = PlayerLog()
@@ -0,0 +1,72 @@
+from collections.abc import Awaitable
+from dataclasses import dataclass
+from typing import final
+from urllib.parse import urlsplit
+
+import asyncio
+import time
+
+from api import YoutubeAPI
+from http_client import HttpClient, shared_http
+
+THUMBNAIL_HOSTS = ("https://i.ytimg.com/",)
+# yt-dlp opens its own connections, only its dns lookup and setup can be warmed
+API_HOSTS = ("https://www.youtube.com/",)
+
+
+@dataclass
+class WarmTiming:
+    target: str
+    seconds: float
+    error: str | None = None
+
+
+@final
+class Prewarmer:
+    def __init__(
+        self,
+        http: HttpClient = shared_http,
+        thumbnail_hosts: tuple[str, ...] = THUMBNAIL_HOSTS,
+        api_hosts: tuple[str, ...] = API_HOSTS,
+        connections: int = 4,
+    ) -> None:
+        self.http = http
+        self.thumbnail_hosts = thumbnail_hosts
+        self.api_hosts = api_hosts
+        self.connections = connections
+        self.report: list[WarmTiming] = []
+
+    async def run(self) -> list[WarmTiming]:
+        _ = await asyncio.gather(
+            *(self._timed(url, self._open_pool(url)) for url in self.thumbnail_hosts),
+            *(self._timed(url, self._resolve(url)) for url in self.api_hosts),
+            self._timed("yt-dlp", asyncio.to_thread(YoutubeAPI.warm_up)),
+        )
+        return self.report
+
+    async def _timed(self, target: str, job: Awaitable[None]) -> None:
+        started = time.perf_counter()
+        error: str | None = None
+        try:
+            await job
+        # yt-dlp raises its own errors, one failed target must not cancel the others
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        self.report.append(WarmTiming(target, time.perf_counter() - started, error))
+
+    async def _open_pool(self, url: str) -> None:
+        # parallel requests leave that many keep-alive connections in the pool,
+        # enough for the first screen of thumbnails
+        responses = await asyncio.gather(
+            *(self.http.get_async(url) for _ in range(self.connections)),
+            return_exceptions=True,
+        )
+        for response in responses:
+            if isinstance(response, BaseException):
+                raise response
+
+    async def _resolve(self, url: str) -> None:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        _ = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port)
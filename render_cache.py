@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image
+from rich.segment import Segment
+from rich.style import Style
+from threading import Lock
+from typing import final
+
+import asyncio
+import hashlib
+import json
+
+from blob_store import BlobStore
+from utils import expect
+
+# halfcell and unicode output is plain segments, sixel output is one string
+type Encoded = list[Segment] | str
+
+
+def pixel_digest(image: Image.Image) -> str:
+    digest = hashlib.blake2b(image.tobytes(), digest_size=16)
+    digest.update(f"{image.mode}:{image.width}x{image.height}".encode())
+    return digest.hexdigest()
+
+
+def _dump(value: Encoded) -> bytes:
+    if isinstance(value, str):
+        return json.dumps({"sixel": value}).encode()
+    return json.dumps(
+        {"segments": [[s.text, str(s.style) if s.style else None] for s in value]}
+    ).encode()
+
+
+def _load(data: bytes) -> Encoded:
+    obj = expect(json.loads(data), dict[str, object])
+    if "sixel" in obj:
+        return expect(obj["sixel"], str)
+    return [
+        Segment(text, Style.parse(style) if style else None)
+        for text, style in expect(obj["segments"], list[tuple[str, str | None]])
+    ]
+
+
+@final
+class RenderCache:
+    DEFAULT_MAX_DISK_BYTES = 64 * 1024 * 1024
+
+    def __init__(
+        self, capacity: int = 512, max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES
+    ) -> None:
+        self.capacity = capacity
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = Lock()
+        self._entries: OrderedDict[str, Encoded] = OrderedDict()
+        self._disk: BlobStore | None = None
+        self._writer: ThreadPoolExecutor | None = None
+
+    # the digest leads, prefetch() finds every rendering of one image by it
+    @staticmethod
+    def key(digest: str, *parts: object) -> str:
+        return f"{digest}-{hashlib.sha1(repr(parts).encode()).hexdigest()}"
+
+    def enable_disk(self, root: str | Path) -> None:
+        if self._disk is not None:
+            return
+
+        self._disk = BlobStore(root)
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="RenderCacheWriterThread")
+
+    # memory only, it runs while rendering; disk entries come in through prefetch()
+    def get(self, key: str) -> Encoded | None:
+        with self._lock:
+            if (value := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            self.misses += 1
+            return None
+
+    def prefetch(self, digest: str) -> int:
+        if self._disk is None:
+            return 0
+
+        loaded = 0
+        for key in self._disk.digests(f"{digest}-"):
+            with self._lock:
+                if key in self._entries:
+                    continue
+            if not (data := self._disk.get(key)):
+                continue
+
+            try:
+                value = _load(data[:])
+            except (ValueError, TypeError, KeyError):
+                self._disk.delete(key)
+                continue
+
+            # the mtime is the recency prune_disk() goes by
+            self._disk.touch(key)
+            self._remember(key, value)
+            loaded += 1
+
+        return loaded
+
+    async def prefetch_async(self, digest: str) -> None:
+        if self._disk is not None:
+            _ = await asyncio.to_thread(self.prefetch, digest)
+
+    def put(self, key: str, value: Encoded) -> None:
+        self._remember(key, value)
+        if self._disk is not None and self._writer is not None:
+            _ = self._writer.submit(self._disk.put, key, _dump(value))
+
+    def _remember(self, key: str, value: Encoded) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                _ = self._entries.popitem(last=False)
+
+    # returns the number of files removed, least recently used first
+    def prune_disk(self) -> int:
+        if self._disk is None:
+            return 0
+
+        files: list[tuple[float, int, str]] = []
+        for digest in self._disk.digests():
+            try:
+                stat = self._disk.path(digest).stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, digest))
+
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, digest in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            self._disk.delete(digest)
+            total -= size
+            removed += 1
+
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+
+shared_render_cache = RenderCache()
@@ -0,0 +1,41 @@
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import final
+
+import asyncio
+
+
+@dataclass
+class _Call[V]:
+    task: asyncio.Future[V]
+    waiters: int = 0
+
+
+@final
+class SingleFlight[K: Hashable, V]:
+    def __init__(self) -> None:
+        self._calls: dict[K, _Call[V]] = {}
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._calls
+
+    async def do(self, key: K, fn: Callable[[], Awaitable[V]]) -> V:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+
+        call.waiters += 1
+        try:
+            # one waiter going away must not cancel the work for the others
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                _ = call.task.cancel()
+                self._forget(key, call)
+
+    def _forget(self, key: K, call: _Call[V]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
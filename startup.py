@@ -0,0 +1,44 @@
+from dataclasses import dataclass
+from threading import Lock
+from typing import final
+
+import time
+
+
+@dataclass
+class Mark:
+    name: str
+    # seconds since this module was imported, the interpreter's own start is not included
+    at: float
+
+
+@final
+class StartupTimeline:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.marks: list[Mark] = []
+        self._lock = Lock()
+
+    def mark(self, name: str) -> None:
+        with self._lock:
+            self.marks.append(Mark(name, time.perf_counter() - self.started))
+
+    def at(self, name: str) -> float | None:
+        with self._lock:
+            return next((mark.at for mark in self.marks if mark.name == name), None)
+
+    def report(self) -> str:
+        with self._lock:
+            marks = sorted(self.marks, key=lambda mark: mark.at)
+
+        lines: list[str] = []
+        previous = 0.0
+        for mark in marks:
+            lines.append(
+                f"{mark.at * 1000:8.1f}ms {(mark.at - previous) * 1000:+8.1f}ms  {mark.name}"
+            )
+            previous = mark.at
+        return "\n".join(lines)
+
+
+shared_timeline = StartupTimeline()
@@ -0,0 +1,81 @@
+from collections.abc import Awaitable, Callable
+from typing import final
+
+import asyncio
+import heapq
+import itertools
+
+# lower sorts first: (tier, distance)
+type Priority = tuple[int, int]
+
+
+@final
+class ThumbnailScheduler:
+    def __init__(self, concurrency: int = 6) -> None:
+        self.concurrency = concurrency
+
+        # heap entries go stale when reprioritized, the dicts hold the truth
+        self._queue: list[tuple[Priority, int, str]] = []
+        self._counter = itertools.count()
+        self._jobs: dict[str, Callable[[], Awaitable[None]]] = {}
+        self._priorities: dict[str, Priority] = {}
+        self._running: dict[str, asyncio.Task[None]] = {}
+
+    def request(
+        self, key: str, job: Callable[[], Awaitable[None]], priority: Priority
+    ) -> None:
+        if key in self._running or key in self._jobs:
+            self.reprioritize(key, priority)
+            return
+
+        self._jobs[key] = job
+        self._push(key, priority)
+
+    def reprioritize(self, key: str, priority: Priority) -> None:
+        if key not in self._jobs or self._priorities.get(key) == priority:
+            return
+
+        self._push(key, priority)
+
+    def cancel(self, key: str) -> None:
+        _ = self._jobs.pop(key, None)
+        _ = self._priorities.pop(key, None)
+        if task := self._running.pop(key, None):
+            _ = task.cancel()
+
+    def cancel_all(self) -> None:
+        for task in self._running.values():
+            _ = task.cancel()
+
+        self._queue.clear()
+        self._jobs.clear()
+        self._priorities.clear()
+        self._running.clear()
+
+    def _push(self, key: str, priority: Priority) -> None:
+        self._priorities[key] = priority
+        heapq.heappush(self._queue, (priority, next(self._counter), key))
+        self._pump()
+
+    def _pump(self) -> None:
+        while len(self._running) < self.concurrency and self._queue:
+            priority, _, key = heapq.heappop(self._queue)
+            if self._priorities.get(key) != priority:
+                continue
+
+            job = self._jobs.pop(key)
+            del self._priorities[key]
+
+            task = asyncio.create_task(job())
+            self._running[key] = task
+            task.add_done_callback(lambda task, key=key: self._done(key, task))
+
+    def _done(self, key: str, task: asyncio.Task[None]) -> None:
+        if self._running.get(key) is task:
+            del self._running[key]
+
+        # a failed thumbnail only leaves its row blank
+        if not task.cancelled():
+            _ = task.exception()
+
+        self._pump()
@@ -0,0 +1,86 @@
+from textual_image.renderable import Image as AutoRenderable
+from textual_image.renderable import HalfcellImage, UnicodeImage
+
+import asyncio
+import os
+
+from image import ImageCache, NetworkImage
+from persistent import shared_db
+
+# used when the terminal does not report its cell size
+DEFAULT_CELL_HEIGHT = 20
+
+# last value read or written per terminal, rows that agree with it skip the write
+_remembered: dict[str, tuple[int, int, int]] = {}
+
+
+def cell_pixel_height() -> int:
+    # pixels one terminal row can actually show with the active renderer
+    if AutoRenderable is HalfcellImage:
+        return 2
+    if AutoRenderable is UnicodeImage:
+        return 1
+
+    try:
+        from textual_image._terminal import get_cell_size
+
+        return get_cell_size().height or DEFAULT_CELL_HEIGHT
+    except Exception:
+        return DEFAULT_CELL_HEIGHT
+
+
+def terminal_key() -> str:
+    term = os.environ.get("TERM_PROGRAM") or os.environ.get("TERM", "unknown")
+    renderer = AutoRenderable.__module__.rsplit(".", 1)[-1]
+    return f"thumbnail_variant:{term}:{renderer}"
+
+
+# (rows, width, height) of the variant that last loaded at first try
+def remembered_variant() -> tuple[int, int, int]:
+    key = terminal_key()
+    _remembered[key] = shared_db.get(key, (0, 0, 0))
+    return _remembered[key]
+
+
+def thumbnail_candidates(
+    thumbnails: list[NetworkImage],
+    rows: int,
+    remembered: tuple[int, int, int],
+    cache: ImageCache,
+) -> list[NetworkImage]:
+    if not thumbnails:
+        return []
+
+    sized = [t for t in thumbnails if t.width > 0 and t.height > 0]
+    if not sized:
+        return list(thumbnails)
+
+    # smallest variant that still has a source pixel for every rendered one
+    target = rows * cell_pixel_height()
+    sharp = [t for t in sized if t.height >= target]
+    blurry = [t for t in sized if t.height < target]
+
+    # then the closest ones on either side, in case the first choice is broken;
+    # on a tie the webp variant wins, the jpeg stays behind it as the fallback
+    sharp.sort(key=lambda t: (t.width * t.height, not t.url.endswith(".webp")))
+    blurry.sort(key=lambda t: (-t.width * t.height, not t.url.endswith(".webp")))
+    candidates = sharp + blurry
+    if remembered[0] == rows:
+        for thumbnail in candidates:
+            if (thumbnail.width, thumbnail.height) == tuple(remembered[1:]):
+                candidates.remove(thumbnail)
+                candidates.insert(0, thumbnail)
+                break
+
+    return [t for t in candidates if cache.get_failure(t.url) is None] or candidates
+
+
+async def remember_thumbnail_async(thumbnail: NetworkImage, rows: int) -> None:
+    key = terminal_key()
+    variant = (rows, thumbnail.width, thumbnail.height)
+    if _remembered.get(key) == variant:
+        return
+
+    _remembered[key] = variant
+    await asyncio.to_thread(shared_db.set, key, variant)
+
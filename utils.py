@@ -7,6 +7,7 @@ from PIL import Image
 
 import os
 import sys
+import threading
 
 
 def format_time(seconds: float) -> str:
@@ -161,3 +162,11 @@ def join_overlap(a: str, b: str) -> str:
         if a[-i:] == b[:i]:
             overlap = i
     return a + b[overlap:]
+
+
+def lower_thread_priority() -> None:
+    # background maintenance should never compete with rendering
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
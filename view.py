@@ -9,7 +9,7 @@ from textual.message import Message
 from textual.css.query import NoMatches
 from textual.reactive import Reactive
 from textual.validation import Number
-from textual.app import ComposeResult
+from textual.app import ComposeResult, RenderResult
 from textual.binding import Binding
 from textual.containers import HorizontalGroup, VerticalGroup, VerticalScroll
 from textual.css.scalar import Scalar
@@ -21,30 +21,39 @@ from textual.widgets import (
     Label,
     Button,
     Input,
+    RichLog,
 )
 from textual.screen import ModalScreen
 from textual_image.renderable import Image as AutoRenderable
 from textual_image.widget._base import Image
-from textual_image.widget import Image as TexImage
 from PIL import Image as PILImage
+from functools import cache, partial
 
-try:
-    from pykakasi import kakasi
+import asyncio
+
+
+# building the converter loads all of its dictionaries, only pay for it once needed
+@cache
+def load_kakasi():
+    try:
+        from pykakasi import kakasi
+    except ModuleNotFoundError:
+        return None
 
     kks = kakasi()
 
     kks.setMode("J", "aF")
     kks.setMode("H", "aF")
     kks.setMode("K", "aF")
-    conv = kks.getConverter()
-except ModuleNotFoundError:
-    kks = None
+    return kks, kks.getConverter()
 
 
 def jp_romanize(text: str) -> str | None:
-    if not kks:
+    if not (loaded := load_kakasi()):
         return None
 
+    kks, _ = loaded
+
     final: list[str] = []
     parts = kks.convert(text)
     for part in parts:
@@ -54,19 +63,35 @@ def jp_romanize(text: str) -> str | None:
 
 
 def to_furigana(text: str) -> str | None:
-    if not kks:
+    if not (loaded := load_kakasi()):
         return
 
+    _, conv = loaded
     return conv.do(text)
 
 
-from api import YoutubeAPI
-from image import NetworkImage
-from model import YoutubeVideo
+from api import YoutubeAPI, download_error
+from image import CachedImage, ImageCache, ImageUnavailableError, NetworkImage
+from image_decode import shared_decoder
+from cached_image import CACHEABLE, SIXEL, CachedRenderable, CachedSixelImage
+from render_cache import pixel_digest, shared_render_cache
+from placeholder import placeholder_image
+from model import MediaSource, YoutubeVideo
 from audio import AudioPlayer
+from ipc_audio import IPCAudioPlayer
 from meter import Meter
 from path_input import PathInput
+from player_bridge import PlayerBridge
+from player_log import LogEntry, player_log
 from persistent import shared_db
+from startup import shared_timeline
+from thumbnail_scheduler import Priority, ThumbnailScheduler
+from thumbnail_variant import (
+    cell_pixel_height,
+    remember_thumbnail_async,
+    remembered_variant,
+    thumbnail_candidates,
+)
 from utils import expect, format_number, format_time
 
 
@@ -89,6 +114,13 @@ class YoutubeVideosView(ListView):
 
             self.video = video
 
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.thumbnails = ThumbnailScheduler()
+        self._last_index = 0
+        self._direction = 1
+
     def action_cursor_top(self) -> None:
         self.index = 0
 
@@ -105,10 +137,103 @@ class YoutubeVideosView(ListView):
 
     @work
     async def watch_videos(self, videos: list[YoutubeVideo]) -> None:
+        self.thumbnails.cancel_all()
         await self.clear()
 
-        for video in videos:
-            await self.append(YoutubeVideoView(video))
+        await self.extend(YoutubeVideoView(video) for video in videos)
+
+        self._last_index = 0
+        self._direction = 1
+        rows = list(self.query_children(YoutubeVideoView))
+
+        # one cache round trip for the whole result list
+        cache, candidates = await self.candidates_for(rows)
+        cached, placeholders = await asyncio.gather(
+            cache.get_cached_images_async([c[0].url for c in candidates if c]),
+            cache.get_placeholders_async([t.url for c in candidates for t in c]),
+        )
+
+        for row, row_candidates in zip(rows, candidates):
+            for thumbnail in row_candidates:
+                if data := placeholders.get(thumbnail.url):
+                    row.query_one(ImageView).show_placeholder(
+                        data, thumbnail.width / (thumbnail.height or 1) or 16 / 9
+                    )
+                    break
+
+        for i, row in enumerate(rows):
+            self.thumbnails.request(
+                f"row-{i}",
+                partial(row.load_thumbnail, candidates[i], cached),
+                self.thumbnail_priority(i, rows),
+            )
+
+    async def candidates_for(
+        self, rows: list["YoutubeVideoView"]
+    ) -> tuple[ImageCache, list[list[NetworkImage]]]:
+        # opening the cache and the settings both touch the disk
+        cache, remembered = await asyncio.gather(
+            asyncio.to_thread(ImageCache), asyncio.to_thread(remembered_variant)
+        )
+        return cache, [
+            thumbnail_candidates(row.video.thumbnails, row.item_size, remembered, cache)
+            for row in rows
+        ]
+
+    async def reload_thumbnail(self, row: "YoutubeVideoView") -> None:
+        _, (candidates,) = await self.candidates_for([row])
+        await row.load_thumbnail(candidates)
+
+    def thumbnail_priority(self, i: int, rows: list["YoutubeVideoView"]) -> Priority:
+        # visible rows first, then the ones we are moving towards, then the rest
+        row_height = (rows[0].outer_size.height if rows else 0) or (
+            YoutubeVideoView.item_size
+        )
+
+        first = int(self.scroll_y) // row_height
+        last = first + max(1, self.scrollable_content_region.height // row_height)
+
+        if first <= i <= last:
+            return (0, i - first)
+
+        ahead = i - last if self._direction > 0 else first - i
+        if ahead > 0:
+            return (1, ahead)
+
+        return (2, abs(i - first))
+
+    def reprioritize_thumbnails(self) -> None:
+        rows = list(self.query_children(YoutubeVideoView))
+        for i in range(len(rows)):
+            self.thumbnails.reprioritize(f"row-{i}", self.thumbnail_priority(i, rows))
+
+    @override
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        super().watch_scroll_y(old_value, new_value)
+        if new_value != old_value:
+            self._direction = 1 if new_value > old_value else -1
+            self.reprioritize_thumbnails()
+
+    @on(ListView.Highlighted)
+    def handle_highlight(self, _: ListView.Highlighted) -> None:
+        if self.index is None or self.index == self._last_index:
+            return
+
+        self._direction = 1 if self.index > self._last_index else -1
+        self._last_index = self.index
+        self.reprioritize_thumbnails()
+
+    # reloads queue with the other thumbnails and fall back like the first load
+    def on_image_view_missing(self, ev: "ImageView.Missing") -> None:
+        rows = list(self.query_children(YoutubeVideoView))
+        for i, row in enumerate(rows):
+            if ev.image_view in row.query(ImageView):
+                self.thumbnails.request(
+                    f"row-{i}",
+                    partial(self.reload_thumbnail, row),
+                    self.thumbnail_priority(i, rows),
+                )
+                return
 
     @on(ListView.Selected)
     def handle_play(self, ev: ListView.Selected) -> None:
@@ -119,6 +244,14 @@ class YoutubeVideosView(ListView):
 
 @final
 class ImageView(Image, Renderable=AutoRenderable):
+    # the released original is gone from the render cache too, fetch it again
+    @final
+    class Missing(Message):
+        def __init__(self, image_view: "ImageView") -> None:
+            super().__init__()
+
+            self.image_view = image_view
+
     def __init__(
         self,
         height: int = 10,
@@ -126,10 +259,25 @@ class ImageView(Image, Renderable=AutoRenderable):
         super().__init__()
 
         self.img_height = height
+        self.digest: str | None = None
+        self.source: NetworkImage | None = None
 
-    @work
-    async def update_image(self, image: PILImage.Image | NetworkImage) -> None:
-        i = image if isinstance(image, PILImage.Image) else await image.fetch_async()
+    async def load(
+        self, image: PILImage.Image | NetworkImage, cached: CachedImage | None = None
+    ) -> None:
+        if isinstance(image, NetworkImage):
+            self.source = image
+
+        i = (
+            image
+            if isinstance(image, PILImage.Image)
+            else await image.fetch_async(cached=cached)
+        )
+        i = await shared_decoder.decode_async(i, self.img_height * cell_pixel_height())
+        digest = await shared_decoder.run(pixel_digest, i)
+        # rendering only looks in memory, earlier renderings are read from disk here
+        await shared_render_cache.prefetch_async(digest)
+        self.digest = digest
         self.image = i
 
         self.styles.width = Scalar.parse("auto")
@@ -137,9 +285,62 @@ class ImageView(Image, Renderable=AutoRenderable):
 
         _ = self.refresh(recompose=True)
 
+    def show_placeholder(self, data: bytes, aspect: float) -> None:
+        if self.digest is not None or (image := placeholder_image(data)) is None:
+            return
+
+        # stretched to the final size, so the row does not shift when the real one lands
+        height = self.img_height * cell_pixel_height()
+        image = image.resize(
+            (max(1, round(height * aspect)), height), PILImage.Resampling.BILINEAR
+        )
+
+        self.digest = pixel_digest(image)
+        self.image = image
+        self.styles.width = Scalar.parse("auto")
+        self.styles.height = self.img_height
+
+        _ = self.refresh(recompose=True)
+
+    def release_image(self) -> None:
+        # the encoded output is cached, only keep what is needed to fetch it again
+        if self.source is None:
+            return
+
+        self._image = None
+        for sixel in self.query(CachedSixelImage):
+            sixel.release_image()
+
+    def reload_image(self) -> None:
+        # called while rendering, where the sender would be whichever pump is drawing
+        if self.source is not None:
+            _ = self.call_later(lambda: self.post_message(ImageView.Missing(self)))
+
+    @override
+    def render(self) -> RenderResult:
+        if self.digest is None or SIXEL:
+            return ""
+        if not CACHEABLE:
+            return super().render()
+
+        return CachedRenderable(
+            self.digest,
+            expect(self.image, PILImage.Image | None),
+            (self._image_width, self._image_height),
+            *self._get_styled_size(),
+            on_cached=self.release_image,
+            on_missing=self.reload_image,
+        )
+
     @override
     def compose(self) -> ComposeResult:
-        yield TexImage(self.image)
+        if SIXEL and self.digest:
+            yield CachedSixelImage(
+                expect(self.image, PILImage.Image | None),
+                self.digest,
+                on_cached=self.release_image,
+                on_missing=self.reload_image,
+            )
 
 
 @final
@@ -157,8 +358,23 @@ class YoutubeVideoView(ListItem):
 
         self.video = video
 
-    async def on_mount(self) -> None:
-        _ = self.query_one(ImageView).update_image(self.video.thumbnails[0])
+    async def load_thumbnail(
+        self,
+        candidates: list[NetworkImage],
+        cached: dict[str, CachedImage] | None = None,
+    ) -> None:
+        for i, thumbnail in enumerate(candidates):
+            try:
+                await self.query_one(ImageView).load(
+                    thumbnail, (cached or {}).get(thumbnail.url)
+                )
+            except (ImageUnavailableError, ValueError, OSError):
+                continue
+
+            # a fallback only says something about this video
+            if i == 0:
+                await remember_thumbnail_async(thumbnail, self.item_size)
+            return
 
     @work
     async def action_download(self) -> None:
@@ -304,7 +520,50 @@ class YoutubePlayer(Widget):
     def __init__(self) -> None:
         super().__init__()
 
-        self.player = AudioPlayer()
+        self.player: AudioPlayer | IPCAudioPlayer | None = None
+        self._starting: asyncio.Future[AudioPlayer | IPCAudioPlayer] | None = None
+
+    def on_mount(self) -> None:
+        self.bridge = PlayerBridge(self)
+
+    # loading libmpv or spawning mpv and waiting for its socket must not hold up
+    # the first frame, the player starts after it or on the first play
+    async def get_player(self) -> AudioPlayer | IPCAudioPlayer:
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self._start_player())
+        return await asyncio.shield(self._starting)
+
+    async def _start_player(self) -> AudioPlayer | IPCAudioPlayer:
+        loglevel = shared_db.get("mpv_loglevel", "warn")
+
+        player: AudioPlayer | IPCAudioPlayer
+        if shared_db.get("player_daemon", False):
+            player = await asyncio.to_thread(
+                IPCAudioPlayer, daemon=True, loglevel=loglevel
+            )
+        elif shared_db.get("player_backend", "libmpv") == "ipc":
+            player = await asyncio.to_thread(IPCAudioPlayer, loglevel=loglevel)
+        else:
+            player = await asyncio.to_thread(AudioPlayer, loglevel=loglevel)
+
+        self.player = player
+        self.bridge.attach(player, "time-pos", "duration", "demuxer-cache-state")
+        shared_timeline.mark("player")
+
+        if player.attached:
+            self.restore_state(player)
+        return player
+
+    @work
+    async def restore_state(self, player: AudioPlayer | IPCAudioPlayer) -> None:
+        title = await player.get_user_data_async("title")
+        if title:
+            self.query_one("#title", Label).update(
+                f"[#aaaaaa]Playing:[/] {expect(title, str)}"
+            )
+
+        paused = await player.is_paused_async()
+        self.query_one("#playback", Button).label = "⏸" if paused else "⏵"
 
     @override
     def compose(self) -> ComposeResult:
@@ -329,57 +588,106 @@ class YoutubePlayer(Widget):
             self.toggle_playback()
 
     def seek(self, s: int) -> None:
-        self.player.seek(s)
+        if self.player is not None:
+            self.player.seek(s)
 
-    def toggle_playback(self) -> None:
-        paused = self.player.toggle_playback()
+    # its own group, an exclusive watch_video would cancel it
+    @work(group="playback")
+    async def toggle_playback(self) -> None:
+        if self.player is None:
+            return
+
+        paused = await self.player.toggle_playback_async()
         if paused:
             self.query_one("#playback", Button).label = "⏸"
         else:
             self.query_one("#playback", Button).label = "⏵"
 
-    @work(thread=True, exclusive=True)
-    def watch_video(self, video: YoutubeVideo | None) -> None:
+    @on(PlayerBridge.Changed)
+    def handle_player_state(self, ev: PlayerBridge.Changed) -> None:
+        state = ev.state
+        progress = self.query_one(YoutubeProgress)
+
+        if time := expect(state.get("time-pos"), float):
+            progress.value = time
+
+        if "duration" in state:
+            progress.max = expect(state["duration"], float) or float("inf")
+
+        if cache := expect(state.get("demuxer-cache-state"), dict[str, float]):
+            self.query_one("#buffered", Label).update(
+                f"{cache['fw-bytes']:,} bytes buffered ({cache['cache-duration']:.2f}s)"
+            )
+
+    @work(exclusive=True)
+    async def watch_video(self, video: YoutubeVideo | None) -> None:
         if video is None:
             return
 
-        self.player.pause()
+        player = await self.get_player()
+        await player.pause_async()
         self.query_one("#title", Label).update(f"[#aaaaaa]Playing:[/] {video.title}")
 
-        self.player.update(f"https://youtube.com/watch?v={video.id}")
+        # resolving here shares the extraction with downloads, mpv's ytdl hook
+        # stays as the fallback
+        try:
+            media = await YoutubeAPI.get_media_async(video.id)
+        except (download_error(), OSError) as e:
+            player_log.handler(
+                "warn", "media", f"resolving {video.id} failed, mpv takes over: {e}"
+            )
+            media = MediaSource(f"https://youtube.com/watch?v={video.id}", {})
 
-        progress = self.query_one(YoutubeProgress)
-        buffer_indicator = self.query_one("#buffered", Label)
+        await player.set_http_headers_async(media.http_headers)
+        player.update(media.url or f"https://youtube.com/watch?v={video.id}")
+        await player.play_async()
+        await player.set_user_data_async("title", video.title)
 
-        def update_progress(time: float) -> None:
-            if not time:
-                return
 
-            progress.value = time
+@final
+class PlayerLogScreen(ModalScreen[None]):
+    DEFAULT_CSS = """
+    PlayerLogScreen {
+        align: center middle;
+    }
 
-        def update_duration(duration: float) -> None:
-            progress.max = duration or float("inf")
+    PlayerLogScreen RichLog {
+        width: 80%;
+        height: 80%;
+        border: round $panel;
+    }
+    """
 
-        def update_cache(cache: dict[str, float]) -> None:
-            if not cache:
-                return
+    BINDINGS = [Binding("escape", "dismiss()"), Binding("q", "dismiss()")]
 
-            buffer_indicator.update(
-                f"{cache['fw-bytes']:,} bytes buffered ({cache['cache-duration']:.2f}s)"
-            )
+    LEVEL_COLORS = {"fatal": "red", "error": "red", "warn": "yellow"}
 
-        self.player.register_callback(
-            "time-pos", fn=lambda value: update_progress(expect(value, float))
-        )
-        self.player.register_callback(
-            "duration", fn=lambda value: update_duration(expect(value, float))
-        )
-        self.player.register_callback(
-            "demuxer-cache-state",
-            fn=lambda value: update_cache(value),  # pyright: ignore[reportArgumentType]
-        )
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.seen = 0
 
-        self.player.play()
+    @override
+    def compose(self) -> ComposeResult:
+        yield RichLog(markup=True, wrap=True, max_lines=player_log.entries.maxlen)
+
+    def on_mount(self) -> None:
+        self.query_one(RichLog).border_title = "Player log"
+        self.poll()
+        _ = self.set_interval(0.5, self.poll)
+
+    def poll(self) -> None:
+        entries, self.seen = player_log.since(self.seen)
+        log = self.query_one(RichLog)
+        for entry in entries:
+            log.write(self.format_entry(entry))
+
+    def format_entry(self, entry: LogEntry) -> str:
+        color = self.LEVEL_COLORS.get(entry.level, "#aaaaaa")
+        return (
+            f"[{color}]{entry.level:>5}[/] [bold]{escape(entry.component)}[/]: "
+            f"{escape(entry.message)}"
+        )
 
 
 # TODO: factor out label-input setting
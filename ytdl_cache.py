@@ -0,0 +1,78 @@
+from pathlib import Path
+from typing import TypedDict, final
+
+import time
+
+# yt-dlp keys the solutions by player version, old players are never read again
+MAX_AGE = 30 * 24 * 60 * 60
+
+
+@final
+class YtdlCache:
+    class CacheStats(TypedDict):
+        root: str
+        total_files: int
+        total_size_bytes: int
+        # files per yt-dlp section, e.g. youtube-nsig or youtube-sigfuncs
+        sections: dict[str, int]
+
+    def __init__(self, root: str | Path = "ytdl_cache") -> None:
+        self.root = Path(root)
+
+    def set_root(self, root: str | Path) -> None:
+        # mpv may run from another directory, hand it an absolute path
+        self.root = Path(root).expanduser().resolve()
+
+    def options(self) -> dict[str, object]:
+        return {"cachedir": str(self.root.resolve())}
+
+    def mpv_raw_options(self) -> str:
+        return f"cache-dir={self.root.resolve()}"
+
+    def files(self) -> list[Path]:
+        if not self.root.is_dir():
+            return []
+        return [path for path in self.root.glob("*/*.json") if path.is_file()]
+
+    def prune(self, max_age: float = MAX_AGE) -> int:
+        cutoff = time.time() - max_age
+        removed = 0
+        for path in self.files():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    # reading the files once pulls them into the page cache before the first play
+    def warm_up(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        _ = self.prune()
+        for path in self.files():
+            try:
+                _ = path.read_bytes()
+            except OSError:
+                continue
+
+    def get_cache_stats(self) -> CacheStats:
+        sections: dict[str, int] = {}
+        total_size = 0
+        files = self.files()
+        for path in files:
+            sections[path.parent.name] = sections.get(path.parent.name, 0) + 1
+            try:
+                total_size += path.stat().st_size
+            except OSError:
+                continue
+
+        return {
+            "root": str(self.root.resolve()),
+            "total_files": len(files),
+            "total_size_bytes": total_size,
+            "sections": sections,
+        }
+
+
+shared_ytdl_cache = YtdlCache()